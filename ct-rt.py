@@ -14,7 +14,10 @@ from racetrack.track import Track
 from racetrack.tk import TrackView
 from racetrack.car import Car
 from racetrack.backtrack import SlowMotionBacktrack, ConstraintBacktrack
-from racetrack.exception import NoSolutionError
+from racetrack.backtrack import TranspositionTable
+from racetrack.runner import SearchRunner
+from racetrack.linalg import numpy
+from racetrack.stats import SearchStats, VisitCounts
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
@@ -27,7 +30,10 @@ class Application(Frame):
         self.grid(sticky=NSEW)
         self.createTrack()
         self.createWidgets()
+        log.info('Calculate the distance field ...')
+        self.distfield = self.track.getDistanceField()
         self.car = Car(self.track)
+        self.runner = None
         log.info('Search a simple path using SlowMotionBacktrack ...')
         backtrack = SlowMotionBacktrack(self.car)
         backtrack.search()
@@ -36,7 +42,9 @@ class Application(Frame):
         self.redrawTrack()
         maxsteos = len(self.solution) - 1
         self.prefixlen.set(str(maxsteos))
-        self.backtrack = ConstraintBacktrack(self.car, maxsteps=maxsteos)
+        self.backtrack = ConstraintBacktrack(self.car, maxsteps=maxsteos,
+                                             distfield=self.distfield,
+                                             table=TranspositionTable())
 
     def createTrack(self):
         log.info('Create track ...')
@@ -111,6 +119,12 @@ class Application(Frame):
         self.nextbutton = Button(buttonframe, text='Next', width=9,
                                  command=self.searchNext)
         self.nextbutton.grid(row=0, column=1, padx=10, pady=2)
+        self.pausebutton = Button(buttonframe, text='Pause', width=9,
+                                  command=self.pauseSearch)
+        self.pausebutton.grid(row=0, column=2, padx=10, pady=2)
+        self.cancelbutton = Button(buttonframe, text='Cancel', width=9,
+                                   command=self.cancelSearch)
+        self.cancelbutton.grid(row=0, column=3, padx=10, pady=2)
 
         self.bind_all("<Control-q>", lambda e:self.quit())
         self.bind_all("<Control-plus>", self.trackview.zoomIn)
@@ -126,29 +140,82 @@ class Application(Frame):
         except ValueError:
             return False
 
-    def redrawTrack(self):
+    def redrawTrack(self, path=None):
+        if path is None:
+            path = self.car.path
         self.trackview.delete('car')
-        self.trackview.drawPath(self.car.path, tags=['car'])
+        self.trackview.drawPath(path, tags=['car'])
+
+    def isSearching(self):
+        return self.runner is not None and self.runner.isRunning()
 
     def setPrefix(self, event):
+        if self.isSearching():
+            # The car may only be touched after the search stopped.
+            self.runner.cancel()
+            self.after(100, self.setPrefix, event)
+            return
         prefix = int(self.prefixlen.get())
         log.info('set prescribed initial path len = %d.' % prefix)
         self.car.reset(prefix)
         self.redrawTrack()
         maxsteps = len(self.solution) - 1
-        self.backtrack = ConstraintBacktrack(self.car, maxsteps=maxsteps)
+        self.backtrack = ConstraintBacktrack(self.car, maxsteps=maxsteps,
+                                             distfield=self.distfield,
+                                             table=TranspositionTable())
 
     def searchNext(self):
+        if self.isSearching():
+            return
         log.info('Search a path using ConstraintBacktrack ...')
         log.info('max step = %d.' % self.backtrack.maxsteps)
-        try:
-            self.backtrack.searchNextSolution()
-            self.solution = self.car.path[:]
-            log.info('Found a solution with %d steps.' % (len(self.solution)-1))
+        self.stats = SearchStats(timers=True)
+        self.backtrack.setStats(self.stats)
+        if numpy is not None:
+            self.stats.visits = VisitCounts(self.track)
+            self.trackview.showHeatmap(self.stats.visits)
+        self.runner = SearchRunner(self.backtrack)
+        self.runner.start()
+        self.pausebutton['text'] = 'Pause'
+        self.trackview.pollRunner(self.runner, self.searchEvent)
+
+    def searchEvent(self, kind, data):
+        if kind == 'solution':
+            self.solution = data
+            log.info('Found a solution with %d steps.' % (len(data) - 1))
+            self.redrawTrack(data)
+        elif kind == 'progress':
+            log.info('%d search steps done.' % data)
+            self.trackview.refreshHeatmap()
+        elif kind == 'error':
+            log.error('Search failed: %s' % data)
+        elif kind == 'done':
+            log.info('No further solution found.')
+            log.info('Search statistics: %s' % self.stats)
+            self.trackview.refreshHeatmap(force=True)
+            self.car.path = self.solution
             self.redrawTrack()
-        except NoSolutionError:
-            log.info('No solution found.')
-            self.car.path = self.solution[:]
+        else:
+            # Leave the car alone, so that the search may be
+            # continued later on.
+            log.info('Search cancelled.')
+            log.info('Search statistics: %s' % self.stats)
+            self.trackview.refreshHeatmap(force=True)
+            self.redrawTrack(self.solution)
+
+    def pauseSearch(self):
+        if not self.isSearching():
+            return
+        if self.runner.isPaused():
+            self.runner.resume()
+            self.pausebutton['text'] = 'Pause'
+        else:
+            self.runner.pause()
+            self.pausebutton['text'] = 'Resume'
+
+    def cancelSearch(self):
+        if self.isSearching():
+            self.runner.cancel()
 
 app = Application()
 app.mainloop()
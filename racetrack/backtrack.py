@@ -2,12 +2,46 @@
 """
 
 
+from collections import OrderedDict
+from itertools import chain
 from racetrack.linalg import *
-import racetrack.car
-from racetrack.exception import RuleViolationError, NoSolutionError
+from racetrack.linalg import numpy
+from racetrack.car import Car
+from racetrack.search import KinematicHeuristic
+from racetrack.stats import clock
+from racetrack.exception import NoSolutionError
 
 
-class SlowMotionBacktrack(object):
+# The unit directions, in the order SlowMotionBacktrack tries them
+# depending on the quadrant of the search direction.
+_Q1Dirs = [ smallVector(0,-1), smallVector(-1,0), 
+            smallVector(0,1), smallVector(1,0) ]
+_Q2Dirs = [ smallVector(1,0), smallVector(0,-1), 
+            smallVector(-1,0), smallVector(0,1) ]
+_Q3Dirs = [ smallVector(0,1), smallVector(1,0), 
+            smallVector(0,-1), smallVector(-1,0) ]
+_Q4Dirs = [ smallVector(-1,0), smallVector(0,1), 
+            smallVector(1,0), smallVector(0,-1) ]
+_NullDirs = [ NullVector ]
+
+
+class _Instrumented(object):
+    """Support a racetrack.stats.SearchStats in a backtrack strategy.
+    """
+
+    stats = None
+
+    def setStats(self, stats):
+        """Attach a SearchStats to the search, the car and the track.
+
+        Pass None to detach it.
+        """
+        self.stats = stats
+        self.car.stats = stats
+        self.car.track.stats = stats
+
+
+class SlowMotionBacktrack(_Instrumented):
     """A backtrack strategy that restricts itself to very slow motions.
 
     Due to the restriction, this will certainly not find an optimal
@@ -15,35 +49,52 @@ class SlowMotionBacktrack(object):
     without too much erratically wandering about.
     """
 
-    def __init__(self, car):
+    def __init__(self, car, distfield=None):
         self.car = car
         self.finish = car.track.finish
         self.stack = []
         self.step = -1
+        self.distfield = distfield
+        self.searchDir = NullVector
+        self.stickSearchDir = False
 
     def searchstep(self):
 
         # From the current position, consider all possible moves and
         # push them to the search stack.
+        stats = self.stats
+        if stats is not None:
+            stats.expanded += 1
+            if stats.visits is not None:
+                stats.visits.add(self.car.pos)
+            if stats.timers:
+                t0 = clock()
         self.step += 1
         direct = self.finish - self.car.pos
-        if direct == Vector(0,0) or not self.stickSearchDir:
+        if direct == NullVector or not self.stickSearchDir:
             searchDir = direct
         else:
             searchDir = self.searchDir
         if searchDir.x > 0 and searchDir.y >= 0:
-            dirs = [ Vector(0,-1),Vector(-1,0),Vector(0,1),Vector(1,0) ]
+            dirs = _Q1Dirs
         elif searchDir.x <= 0 and searchDir.y > 0:
-            dirs = [ Vector(1,0),Vector(0,-1),Vector(-1,0),Vector(0,1) ]
+            dirs = _Q2Dirs
         elif searchDir.x < 0 and searchDir.y <= 0:
-            dirs = [ Vector(0,1),Vector(1,0),Vector(0,-1),Vector(-1,0) ]
+            dirs = _Q3Dirs
         elif searchDir.x >= 0 and searchDir.y < 0:
-            dirs = [ Vector(-1,0),Vector(0,1),Vector(1,0),Vector(0,-1) ]
+            dirs = _Q4Dirs
         else:
-            dirs = [ Vector(0,0) ]
-        self.searchDir = dirs[-1]
+            dirs = _NullDirs
+        if self.distfield is not None and dirs is not _NullDirs:
+            dirs = self._orderByDistance(dirs)
+        if dirs:
+            self.searchDir = dirs[-1]
         for d in dirs:
             self.stack.append( (self.step, d) )
+        if stats is not None:
+            if stats.timers:
+                stats.expandTime += clock() - t0
+            stats.stack(len(self.stack))
 
         # pop a possible move from the stack and try it.  Repeat if
         # the move fails.
@@ -56,42 +107,135 @@ class SlowMotionBacktrack(object):
                 self.step = step
                 self.car.reset(step)
                 self.searchDir = d
-            if (d != Vector(0,0) and (self.car.pos + d) in self.car.path):
+            if (d != NullVector and self.car.hasVisited(self.car.pos + d)):
                 continue
-            try:
-                self.car.move(d)
+            if self.car.tryMove(d) == Car.MoveOk:
                 self.stickSearchDir = (d != self.searchDir)
-            except RuleViolationError:
-                pass
-            else:
                 break
 
+        if stats is not None:
+            stats.tick()
+
+    def _orderByDistance(self, dirs):
+        # Order the directions such that the one leading closest to
+        # the finish according to the distance field gets tried
+        # first.  Drop directions from which the finish can not be
+        # reached at all.
+        pos = self.car.pos
+        dist = []
+        for d in dirs:
+            dd = self.distfield.distance(pos + d)
+            if dd is not None:
+                dist.append( (dd, d) )
+        dist.sort(key=lambda t: t[0], reverse=True)
+        return [ d for (dd, d) in dist ]
+
     def search(self):
-        self.searchDir = Vector(0,0)
+        self.searchDir = NullVector
         self.stickSearchDir = False
         while not self.car.finished():
             self.searchstep()
+        if self.stats is not None:
+            self.stats.solutions += 1
+
+
+class TranspositionTable(object):
+    """Record the best step at which each state has been reached.
+
+    The states are tuples (pos, velocity) of the car.  The table holds
+    at most maxsize entries, if it is full, the least recently used
+    entry is evicted.  Evicting an entry does not affect the
+    correctness of a search using the table, it only looses the
+    opportunity to prune a revisit of that state.
+    """
+
+    def __init__(self, maxsize=1000000):
+        if not maxsize > 0:
+            raise ValueError("maxsize must be larger then zero.")
+        self.maxsize = maxsize
+        self._table = OrderedDict()
+
+    def __len__(self):
+        return len(self._table)
+
+    def lookup(self, state):
+        """Return the best step at which state has been reached.
 
+        Return None if the state is not in the table.
+        """
+        table = self._table
+        try:
+            step = table.pop(state)
+        except KeyError:
+            return None
+        table[state] = step
+        return step
 
-class ConstraintBacktrack(object):
+    def store(self, state, step):
+        """Record that state has been reached at step.
+        """
+        table = self._table
+        best = table.pop(state, None)
+        if best is not None and best < step:
+            step = best
+        table[state] = step
+        if len(table) > self.maxsize:
+            table.popitem(last=False)
+
+    def clear(self):
+        self._table.clear()
+
+
+class ConstraintBacktrack(_Instrumented):
     """A backtrack strategy with constraints.
 
     A full backtrack algorithm that can be constraint to a starting
     path and a maximum number of steps to solution.
+
+    A TranspositionTable may be passed in table.  The search then
+    prunes all moves leading to a state that has already been reached
+    at the same or an earlier step.  The table is kept over
+    subsequent calls of searchNextSolution().
+
+    If the checkpointer attribute is set to a
+    racetrack.checkpoint.Checkpointer, the state of the search is
+    saved periodically and can be restored with loadCheckpoint().
+
+    A racetrack.stats.SearchStats may be attached with setStats().
+
+    If batchCollision is True, the candidate moves from a position are
+    checked for collision in one vectorized call to
+    Track.checkCollisions() before they are pushed to the stack, and
+    are not checked again when they are tried.  It is turned on if
+    the moves and the barriers they have to be tested against are
+    expected to be enough to pay off the overhead of the call.
     """
 
-    def __init__(self, car, maxsteps = None):
+    # The minimum expected number of moves plus candidate pairs of a
+    # move and a barrier per search step for batchCollision.
+    BatchCollisionMinPairs = 64
+    # The number of positions sampled to estimate the number of
+    # candidate barriers per move.
+    BatchCollisionSamples = 64
+
+    def __init__(self, car, maxsteps = None, distfield = None, 
+                 table = None):
         self.car = car
         self.finish = car.track.finish
         self.stack = []
         self.step = len(car.path) - 2
         self.maxsteps = maxsteps
-        # compile a list of all allowed accelerations.
-        self._accel = filter(self.car.accelerationRule.isAllowed, 
-                             [Vector(x,y) 
-                              for x in range(-10,11) 
-                              for y in range(-10,11)])
         self.solution = None
+        # If a DistanceField is given, use it to order the moves and
+        # to cut branches that can not beat maxsteps.
+        self.distfield = distfield
+        rule = self.car.accelerationRule
+        self._kinematics = KinematicHeuristic(rule.allAccelerations())
+        self.table = table
+        self.checkpointer = None
+        self.batchCollision = (numpy is not None and 
+                               self._expectedPairs() >=
+                               self.BatchCollisionMinPairs)
 
     def searchstep(self):
 
@@ -101,12 +245,39 @@ class ConstraintBacktrack(object):
 
         # From the current position, consider all possible moves and
         # push them to the search stack.
+        stats = self.stats
+        if stats is not None:
+            stats.expanded += 1
+            if stats.visits is not None:
+                stats.visits.add(self.car.pos)
+            if stats.timers:
+                t0 = clock()
         self.step += 1
         if self.maxsteps is None or self.step < self.maxsteps:
-            self._accel.sort(key=diststep, reverse=True)
-            for a in self._accel:
-                d = self.car.velocity + a
+            if self.distfield is None:
+                velocity = self.car.velocity
+                accel = self.car.accelerationRule.accelerations(velocity)
+                accel = sorted(accel, key=diststep, reverse=True)
+                moves = [ velocity + a for a in accel ]
+            else:
+                moves = self._fieldMoves()
+            if self.batchCollision and moves:
+                pos = self.car.pos
+                p0 = numpy.empty((len(moves), 2), dtype=numpy.int64)
+                p0[:] = pos
+                # Much faster than numpy.asarray() on a list of Vectors.
+                p1 = numpy.fromiter(chain.from_iterable(moves),
+                                    dtype=numpy.int64, count=2*len(moves))
+                p1 = p1.reshape(-1, 2) + p0
+                collides = self.car.track.checkCollisions(SegmentArray(p0, p1))
+                moves = [ d for (d, c) in zip(moves, collides.tolist())
+                          if not c ]
+            for d in moves:
                 self.stack.append( (self.step, d) )
+        if stats is not None:
+            if stats.timers:
+                stats.expandTime += clock() - t0
+            stats.stack(len(self.stack))
 
         # pop a possible move from the stack and try it.  Repeat if
         # the move fails.
@@ -118,20 +289,85 @@ class ConstraintBacktrack(object):
             if step != self.step:
                 self.step = step
                 self.car.reset(step)
-            try:
-                self.car.move(d)
-            except RuleViolationError:
-                pass
-            else:
+            if self.table is not None:
+                state = (self.car.pos + d, d)
+                best = self.table.lookup(state)
+                if best is not None and best <= step + 1:
+                    continue
+            if self.car.tryMove(d, self.batchCollision) == Car.MoveOk:
+                if self.table is not None:
+                    self.table.store(state, step + 1)
                 break
 
+        if self.checkpointer is not None:
+            self.checkpointer.tick()
+        if stats is not None:
+            stats.tick()
+
+    def _expectedPairs(self):
+        # Estimate the number of moves plus candidate pairs of a move
+        # and a barrier per search step from the moves from rest at
+        # a sample of positions on the track.
+        track = self.car.track
+        accel = numpy.array(self.car.accelerationRule.allAccelerations(),
+                            dtype=numpy.int64)
+        rnd = numpy.random.RandomState(0)
+        n = self.BatchCollisionSamples
+        pos = numpy.column_stack((rnd.randint(1, track.width + 1, n),
+                                  rnd.randint(1, track.height + 1, n)))
+        p0 = numpy.repeat(pos, len(accel), axis=0)
+        p1 = p0 + numpy.tile(accel, (n, 1))
+        try:
+            (move, key) = track.candidatePairs(p0, p1)
+        except TypeError:
+            # Barriers that do not fit into a NumPy array, e.g.
+            # with Fraction coordinates.
+            return 0
+        return (len(p0) + len(move)) // n
+
+    def _fieldMoves(self):
+        # Return the candidate moves from the current position in the
+        # order they should be pushed to the stack, i.e. the most
+        # promising one last.  Moves that end in a position from
+        # which the finish can not be reached within maxsteps are
+        # dropped.
+        pos = self.car.pos
+        velocity = self.car.velocity
+        distfield = self.distfield
+        pathSteps = self._kinematics.pathSteps
+        finish = self.finish
+        minsteps = self.step + 1
+        moves = []
+        for a in self.car.accelerationRule.accelerations(velocity):
+            d = velocity + a
+            newpos = pos + d
+            dist = distfield.distance(newpos)
+            if dist is None:
+                continue
+            if self.maxsteps is not None:
+                speed = max(abs(d.x), abs(d.y))
+                if minsteps + pathSteps(dist, speed) > self.maxsteps:
+                    continue
+            moves.append( (dist, (finish - newpos).norm2(), d) )
+        moves.sort(key=lambda t: t[:2], reverse=True)
+        return [ d for (dist, norm, d) in moves ]
+
+    def recordSolution(self):
+        """Record the current path of the car as solution.
+
+        Subsequent searches will only look for shorter solutions.
+        """
+        self.solution = list(self.car.path)
+        self.maxsteps = len(self.solution) - 2
+        if self.stats is not None:
+            self.stats.solutions += 1
+
     def searchNextSolution(self):
         while True:
             self.searchstep()
             if self.car.finished():
                 break
-        self.solution = list(self.car.path)
-        self.maxsteps = len(self.solution) - 2
+        self.recordSolution()
 
     def search(self):
         while True:
@@ -0,0 +1,234 @@
+"""Solve many tracks without a user interface.
+
+The tracks are read from track files, see racetrack.trackfile, and
+solved in parallel, each one in a worker process of its own.  The
+results are written as JSON Lines, one object per track in the order
+the searches finish, with the keys:
+
+track
+    The name of the track file.
+solver, rule
+    The names of the solver and the acceleration rule.
+status
+    One of 'solved', 'nosolution', 'timeout', or 'error'.
+optimal
+    True if the solution is known to be optimal.
+steps, path
+    The number of steps and the positions of the solution, if any.
+seconds
+    The wall clock time spent on the track.
+error
+    The error message if status is 'error'.
+
+Each search is limited to the given time.  The backtrack solvers
+report the best solution found so far when the time is up, the other
+solvers are stopped without result.
+
+The constraint solver is pruned with the distance field of the track,
+which never overestimates the remaining path.  So it still finds the
+optimal solution through a narrow gap between two barriers:
+
+>>> import os, tempfile
+>>> from racetrack.linalg import Point, LineSegment
+>>> track = Track(10, 10, Point(2, 5), Point(8, 6),
+...               [LineSegment(Point(5, 0), Point(5, 5)),
+...                LineSegment(Point(5, 6), Point(5, 11))])
+>>> (fd, fname) = tempfile.mkstemp(suffix='.rt')
+>>> os.close(fd)
+>>> track.save(fname)
+>>> result = solveTrack(fname, 'constraint', 'EightNeighboursRule', 60)
+>>> os.remove(fname)
+>>> (result['status'], result['steps'], result['optimal'])
+('solved', 6, True)
+"""
+
+
+import sys
+import time
+import json
+import argparse
+import multiprocessing
+try:
+    import queue
+except ImportError:
+    # Python 2.x
+    import Queue as queue
+import racetrack.rules
+from racetrack.rules import AccelerationRule
+from racetrack.track import Track
+from racetrack.car import Car
+from racetrack.search import AStarSearch, BidirectionalSearch
+from racetrack.backtrack import (SlowMotionBacktrack, ConstraintBacktrack,
+                                 TranspositionTable)
+from racetrack.exception import NoSolutionError
+
+
+Solvers = ['astar', 'bidirectional', 'constraint', 'slowmotion']
+
+# Extra time given to a worker process beyond the time limit before it
+# is killed.
+KillGrace = 2.0
+
+
+def ruleNames():
+    """Return the names of the acceleration rules in racetrack.rules.
+    """
+    names = []
+    for name in dir(racetrack.rules):
+        obj = getattr(racetrack.rules, name)
+        if (isinstance(obj, type) and issubclass(obj, AccelerationRule) and
+            obj.Norm is not None):
+            names.append(name)
+    return names
+
+
+def _backtrack(car, backtrack, deadline):
+    # Run a backtrack strategy until it is exhausted or until the
+    # deadline.  Return a tuple (path, finished).
+    solution = None
+    try:
+        while time.time() < deadline:
+            backtrack.searchstep()
+            if car.finished():
+                solution = list(car.path)
+                if isinstance(backtrack, ConstraintBacktrack):
+                    backtrack.recordSolution()
+                else:
+                    return (solution, True)
+        return (solution, False)
+    except NoSolutionError:
+        return (solution, True)
+
+
+def solveTrack(fname, solver, rule, timelimit):
+    """Solve the track in the file fname and return the result as dict.
+    """
+    t0 = time.time()
+    deadline = t0 + timelimit if timelimit else float('inf')
+    result = { 'track': fname, 'solver': solver, 'rule': rule,
+               'optimal': False }
+    try:
+        track = Track.load(fname)
+        car = Car(track)
+        car.accelerationRule = getattr(racetrack.rules, rule)
+        if solver in ('astar', 'bidirectional'):
+            cls = AStarSearch if solver == 'astar' else BidirectionalSearch
+            cls(car).search()
+            (path, finished) = (list(car.path), True)
+            result['optimal'] = True
+        elif solver == 'slowmotion':
+            backtrack = SlowMotionBacktrack(car)
+            (path, finished) = _backtrack(car, backtrack, deadline)
+        elif solver == 'constraint':
+            # The distance field is a lower bound of the remaining
+            # path, so pruning with it keeps the search exhaustive and
+            # the result optimal.
+            backtrack = ConstraintBacktrack(car,
+                                            distfield=track.getDistanceField(),
+                                            table=TranspositionTable())
+            (path, finished) = _backtrack(car, backtrack, deadline)
+            result['optimal'] = finished and path is not None
+        else:
+            raise ValueError("Invalid solver %s." % solver)
+        if path is not None:
+            result['status'] = 'solved'
+            result['steps'] = len(path) - 1
+            result['path'] = [ [p.x, p.y] for p in path ]
+        elif finished:
+            result['status'] = 'nosolution'
+        else:
+            result['status'] = 'timeout'
+    except NoSolutionError:
+        result['status'] = 'nosolution'
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = "%s: %s" % (type(e).__name__, e)
+    result['seconds'] = time.time() - t0
+    return result
+
+
+def _worker(results, i, fname, solver, rule, timelimit):
+    results.put( (i, solveTrack(fname, solver, rule, timelimit)) )
+
+
+def solveTracks(fnames, solver, rule, timelimit=None, processes=None):
+    """Solve the tracks in the files fnames in parallel.
+
+    Yield the results as dicts in the order the searches finish.  At
+    most processes searches are run at the same time, the default is
+    the number of CPUs.  Searches that exceed timelimit seconds by more
+    than KillGrace are killed.
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    results = multiprocessing.Queue()
+    pending = list(reversed(list(enumerate(fnames))))
+    running = {}
+    while pending or running:
+        while pending and len(running) < processes:
+            (i, fname) = pending.pop()
+            args = (results, i, fname, solver, rule, timelimit)
+            proc = multiprocessing.Process(target=_worker, args=args)
+            proc.daemon = True
+            proc.start()
+            running[i] = (fname, proc, time.time())
+        try:
+            (i, result) = results.get(timeout=0.1)
+        except queue.Empty:
+            pass
+        else:
+            (fname, proc, t0) = running.pop(i)
+            proc.join()
+            yield result
+        now = time.time()
+        for (i, (fname, proc, t0)) in list(running.items()):
+            if timelimit and now - t0 > timelimit + KillGrace:
+                proc.terminate()
+                proc.join()
+                del running[i]
+                yield { 'track': fname, 'solver': solver, 'rule': rule,
+                        'optimal': False, 'status': 'timeout',
+                        'seconds': now - t0 }
+            elif not proc.is_alive() and results.empty():
+                # The worker died without posting a result.
+                proc.join()
+                del running[i]
+                yield { 'track': fname, 'solver': solver, 'rule': rule,
+                        'optimal': False, 'status': 'error',
+                        'error': "Worker exited with code %s."
+                        % proc.exitcode,
+                        'seconds': now - t0 }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve race tracks.")
+    parser.add_argument('tracks', metavar='TRACKFILE', nargs='+',
+                        help="track files to solve")
+    parser.add_argument('-s', '--solver', choices=Solvers, default='astar',
+                        help="the solver to use (default: %(default)s)")
+    parser.add_argument('-r', '--rule', choices=ruleNames(),
+                        default='EightNeighboursRule',
+                        help="the acceleration rule (default: %(default)s)")
+    parser.add_argument('-t', '--time-limit', type=float, dest='timelimit',
+                        metavar='SECONDS',
+                        help="time limit for each track")
+    parser.add_argument('-j', '--processes', type=int,
+                        help="number of worker processes "
+                        "(default: number of CPUs)")
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help="write the results to FILE "
+                        "rather than to standard output")
+    args = parser.parse_args(argv)
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for result in solveTracks(args.tracks, args.solver, args.rule,
+                                  args.timelimit, args.processes):
+            out.write(json.dumps(result, sort_keys=True) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
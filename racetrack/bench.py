@@ -0,0 +1,300 @@
+"""Benchmarks for the racetrack package.
+
+Run the benchmarks with
+
+    python -m racetrack.bench [-o results.json]
+
+The results are written as JSON, so that the timings of different
+releases can be compared.  All random input is generated from a fixed
+seed, so the runs are reproducible.  Each timing is the best of a
+number of repetitions.
+
+The solver benchmarks run each backtrack strategy on each track under
+each acceleration rule for at most a given number of search steps.
+SlowMotionBacktrack stops at the first solution.  As in ct-rt.py,
+ConstraintBacktrack starts from that solution and searches ever
+shorter ones, guided by the distance field of the track, so that each
+run ends with a solution whose length can be compared.  The status of
+each run is one of 'solved', 'optimal' if the search space has been
+exhausted, so that the solution is optimal, 'nosolution' or 'budget'
+if the search steps have been used up without any solution.
+"""
+
+
+import sys
+import json
+import random
+import platform
+import argparse
+import racetrack
+from racetrack.linalg import *
+from racetrack.track import Track
+from racetrack.car import Car
+from racetrack.rules import (EightNeighboursRule, FourNeighboursRule,
+                             EuclideanTenRule)
+from racetrack.backtrack import (SlowMotionBacktrack, ConstraintBacktrack,
+                                 TranspositionTable)
+from racetrack.stats import clock
+from racetrack.exception import NoSolutionError, CollisionError
+
+
+Rules = [ EightNeighboursRule, FourNeighboursRule, EuclideanTenRule ]
+Solvers = [ SlowMotionBacktrack, ConstraintBacktrack ]
+
+# (width, height, number of barriers) of the generated tracks.
+GeneratedTracks = [ (50, 40, 10), (100, 80, 40), (200, 160, 160),
+                    (400, 320, 640) ]
+
+
+def ctTrack():
+    """Return the track from ct-rt.py.
+    """
+    p1 = Point(200, 100)
+    p2 = Point(100, 100)
+    p3 = Point(100, 200)
+    p4 = Point(200, 200)
+    p5 = Point(250, 200)
+    p6 = Point(250, 300)
+    p7 = Point(400, 100)
+    p8 = Point(300, 100)
+    p9 = Point(300, 200)
+    p10 = Point(400, 200)
+    p11 = Point(300, 300)
+    barriers = [ LineSegment(p1, p2), LineSegment(p2, p3),
+                 LineSegment(p3, p4),
+                 LineSegment(p5, p6),
+                 LineSegment(p7, p8), LineSegment(p8, p9),
+                 LineSegment(p10, p9), LineSegment(p9, p11) ]
+    return Track(499, 399, Point(120, 180), Point(320, 220), barriers)
+
+
+def _near(segment, p, margin=3):
+    # True if the bounding box of segment comes closer than margin
+    # to the point p.
+    (x0, x1) = sorted((segment.p0.x, segment.p1.x))
+    (y0, y1) = sorted((segment.p0.y, segment.p1.y))
+    return (x0 - margin < p.x < x1 + margin and
+            y0 - margin < p.y < y1 + margin)
+
+
+def generatedTrack(width, height, nbarriers, seed=0):
+    """Return a track with nbarriers random barriers.
+
+    The start and the finish are placed close to opposite corners.
+    The barriers are short horizontal or vertical walls that leave a
+    margin around the start and the finish free.
+    """
+    rnd = random.Random(seed)
+    start = Point(2, 2)
+    finish = Point(width - 1, height - 1)
+    maxlen = max(2, min(width, height) // 5)
+    barriers = []
+    while len(barriers) < nbarriers:
+        p = Point(rnd.randint(1, width), rnd.randint(1, height))
+        l = rnd.randint(1, maxlen)
+        if rnd.random() < 0.5:
+            b = LineSegment(p, Point(min(p.x + l, width), p.y))
+        else:
+            b = LineSegment(p, Point(p.x, min(p.y + l, height)))
+        if not (_near(b, start) or _near(b, finish)):
+            barriers.append(b)
+    return Track(width, height, start, finish, barriers)
+
+
+def randomSegments(n, size, maxlen, rnd):
+    """Return a list of n random LineSegments within a square of the
+    given size, each spanning at most maxlen in each coordinate.
+    """
+    segments = []
+    for i in range(n):
+        p = Point(rnd.randint(0, size), rnd.randint(0, size))
+        v = Vector(rnd.randint(-maxlen, maxlen), rnd.randint(-maxlen, maxlen))
+        segments.append(LineSegment(p, p + v))
+    return segments
+
+
+def bestOf(func, repeat):
+    """Call func repeat times and return the shortest time in seconds.
+    """
+    best = None
+    for i in range(repeat):
+        t0 = clock()
+        func()
+        t = clock() - t0
+        if best is None or t < best:
+            best = t
+    return best
+
+
+def benchIntersection(n, repeat, seed):
+    """Time LineSegment.__and__ on n random pairs of segments.
+    """
+    rnd = random.Random(seed)
+    a = randomSegments(n, 100, 20, rnd)
+    b = randomSegments(n, 100, 20, rnd)
+    pairs = list(zip(a, b))
+    def run():
+        for (s, t) in pairs:
+            s & t
+    t = bestOf(run, repeat)
+    hits = sum(1 for (s, t) in pairs if s & t)
+    return { 'pairs': n, 'intersecting': hits,
+             'seconds': t, 'perSecond': n / t }
+
+
+def benchCollision(track, n, repeat, seed):
+    """Time Track.checkCollision on n random moves within the track.
+    """
+    rnd = random.Random(seed)
+    moves = []
+    for i in range(n):
+        p = Point(rnd.randint(1, track.width), rnd.randint(1, track.height))
+        v = Vector(rnd.randint(-10, 10), rnd.randint(-10, 10))
+        moves.append(LineSegment(p, p + v))
+    def run():
+        for m in moves:
+            try:
+                track.checkCollision(m)
+            except CollisionError:
+                pass
+    t = bestOf(run, repeat)
+    collisions = sum(1 for m in moves if track.findCollision(m) is not None)
+    return { 'moves': n, 'collisions': collisions,
+             'seconds': t, 'perSecond': n / t }
+
+
+def benchSolver(track, solver, rule, maxsteps, solution=None):
+    """Run solver on track under rule for at most maxsteps search steps.
+
+    SlowMotionBacktrack stops at its first solution.  As in ct-rt.py,
+    ConstraintBacktrack is guided by the distance field of the track,
+    uses a TranspositionTable and starts from solution, if given, then
+    searches ever shorter solutions until the search space has been
+    exhausted.  Return the tuple (result, path) of the dict of results
+    and the best solution found or None.
+    """
+    car = Car(track)
+    car.accelerationRule = rule
+    if issubclass(solver, ConstraintBacktrack):
+        backtrack = solver(car, distfield=track.getDistanceField(),
+                           table=TranspositionTable())
+        if solution is not None:
+            backtrack.solution = list(solution)
+            backtrack.maxsteps = len(solution) - 2
+    else:
+        backtrack = solver(car)
+        solution = None
+    steps = 0
+    solutions = 0
+    exhausted = False
+    t0 = clock()
+    try:
+        while steps < maxsteps:
+            backtrack.searchstep()
+            steps += 1
+            if car.finished():
+                solutions += 1
+                if solver is SlowMotionBacktrack:
+                    solution = list(car.path)
+                    break
+                backtrack.recordSolution()
+                solution = backtrack.solution
+    except NoSolutionError:
+        exhausted = True
+    t = clock() - t0
+    if solution is None:
+        status = 'nosolution' if exhausted else 'budget'
+    else:
+        status = 'optimal' if exhausted else 'solved'
+    result = { 'solver': solver.__name__, 'rule': rule.__name__,
+               'status': status, 'searchSteps': steps, 'seconds': t,
+               'solutions': solutions }
+    if solution is not None:
+        result['pathSteps'] = len(solution) - 1
+    return (result, solution)
+
+
+def trackInfo(name, track):
+    return { 'name': name, 'width': track.width, 'height': track.height,
+             'barriers': len(track.barriers) }
+
+
+def runBenchmarks(quick=False, seed=0, maxsteps=None, log=None):
+    """Run all benchmarks and return the results as a dict.
+
+    If quick is True, the benchmarks are run with less repetitions and
+    smaller input.  log, if given, is called with a message before
+    each benchmark.
+    """
+    if log is None:
+        log = lambda msg: None
+    repeat = 1 if quick else 5
+    n = 10000 if quick else 100000
+    if maxsteps is None:
+        maxsteps = 1000 if quick else 5000
+    tracks = [ ('ct', ctTrack()) ]
+    for (w, h, nb) in GeneratedTracks:
+        name = 'generated-%dx%d' % (w, h)
+        tracks.append( (name, generatedTrack(w, h, nb, seed)) )
+
+    results = {
+        'racetrack': racetrack.__version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'quick': quick,
+        'maxSearchSteps': maxsteps,
+    }
+    log("LineSegment.__and__ ...")
+    results['intersection'] = benchIntersection(n, repeat, seed)
+    results['tracks'] = []
+    for (name, track) in tracks:
+        info = trackInfo(name, track)
+        log("Track.checkCollision on %s ..." % name)
+        info['collision'] = benchCollision(track, n, repeat, seed)
+        info['solvers'] = []
+        # The solutions of SlowMotionBacktrack are the starting points
+        # of ConstraintBacktrack.
+        solutions = {}
+        for solver in Solvers:
+            for rule in Rules:
+                log("%s with %s on %s ..."
+                    % (solver.__name__, rule.__name__, name))
+                (result, path) = benchSolver(track, solver, rule, maxsteps,
+                                             solutions.get(rule))
+                solutions[rule] = path
+                info['solvers'].append(result)
+        results['tracks'].append(info)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m racetrack.bench",
+                                     description="Run benchmarks.")
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help="write the results to FILE "
+                        "rather than to standard output")
+    parser.add_argument('-q', '--quick', action='store_true',
+                        help="run a shorter benchmark")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="seed for the random input")
+    parser.add_argument('--max-steps', type=int, dest='maxsteps',
+                        help="maximum number of search steps per solver run")
+    args = parser.parse_args(argv)
+    def log(msg):
+        sys.stderr.write(msg + "\n")
+        sys.stderr.flush()
+    results = runBenchmarks(quick=args.quick, seed=args.seed,
+                            maxsteps=args.maxsteps, log=log)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+
+
+if __name__ == '__main__':
+    main()
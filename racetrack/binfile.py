@@ -0,0 +1,66 @@
+"""Read and write packed integer arrays.
+
+The binary files of the package, see racetrack.trackfile and
+racetrack.checkpoint, store their data as packed arrays of 32 bit
+integers in little endian byte order, independent of the byte order
+of the machine.
+
+>>> data = packInts([1, -2, 3])
+>>> len(data)
+12
+>>> list(intArray(data, 4, 2))
+[-2, 3]
+>>> packedBytes(intArray(data, 4, 2)) == data[4:]
+True
+>>> intArray(data, 4, 3, 'Track file')
+Traceback (most recent call last):
+...
+ValueError: Track file is truncated.
+"""
+
+
+import sys
+from array import array
+
+
+def packInts(values):
+    """Return the integers in values packed as bytes.
+    """
+    a = array('i', values)
+    if sys.byteorder == 'big':
+        a.byteswap()
+    return a.tobytes() if hasattr(a, 'tobytes') else a.tostring()
+
+
+def intArray(buf, offset, count, name='File'):
+    """Return a sequence of count integers from buf at offset.
+
+    Raise ValueError if buf is too short, name is the kind of file
+    reported in the error.  On little endian machines with Python 3,
+    this is a view on buf that does not copy the data.
+    """
+    size = 4 * count
+    if len(buf) < offset + size:
+        raise ValueError("%s is truncated." % name)
+    if sys.byteorder == 'little' and hasattr(memoryview, 'cast'):
+        return memoryview(buf)[offset:offset+size].cast('i')
+    a = array('i')
+    data = buf[offset:offset+size]
+    if hasattr(a, 'frombytes'):
+        a.frombytes(data)
+    else:
+        a.fromstring(data)
+    if sys.byteorder == 'big':
+        a.byteswap()
+    return a
+
+
+def packedBytes(a):
+    """Return the integers of an array returned by intArray() packed
+    as bytes.
+
+    Unlike the array itself, the bytes can be pickled.
+    """
+    if isinstance(a, memoryview):
+        return a.tobytes()
+    return packInts(a)
@@ -2,25 +2,115 @@
 """
 
 
+try:
+    from collections.abc import Sequence
+except ImportError:
+    # Python 2.x
+    from collections import Sequence
 from racetrack.linalg import *
 import racetrack.track
 import racetrack.rules
 from racetrack.exception import AccelerationNotAllowed
 
 
+class PathView(Sequence):
+    """A read only view on the path of a Car.
+
+    It behaves like the list of Points the car visited so far.  Slices
+    return a new list.  Membership tests take constant time.
+    """
+
+    __slots__ = ('_car',)
+
+    def __init__(self, car):
+        self._car = car
+
+    def __len__(self):
+        return len(self._car._positions)
+
+    def __getitem__(self, i):
+        return self._car._positions[i]
+
+    def __iter__(self):
+        return iter(self._car._positions)
+
+    def __contains__(self, p):
+        return self._car.hasVisited(p)
+
+    def __eq__(self, other):
+        if isinstance(other, PathView):
+            other = other._car._positions
+        return self._car._positions == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self._car._positions)
+
+
 class Car(object):
 
+    # Status codes returned by tryMove().
+    MoveOk = 0
+    MoveCollision = 1
+    MoveAccelerationNotAllowed = 2
+
     def __init__(self, track):
         self.track = track
-        self.path = [ track.start ]
         self.accelerationRule = racetrack.rules.EightNeighboursRule
-        self.pos = track.start
-        self.velocity = Vector(0, 0)
+        # A racetrack.stats.SearchStats counting the moves tried.
+        self.stats = None
+        # The history of the car is kept in two parallel stacks of
+        # positions and velocities, that are truncated in place on
+        # reset().  _visited counts how often each position occurs
+        # in the history.
+        self._positions = []
+        self._velocities = []
+        self._visited = {}
+        self._pathview = PathView(self)
+        self._push(track.start, NullVector)
+
+    def _push(self, pos, velocity):
+        self._positions.append(pos)
+        self._velocities.append(velocity)
+        self._visited[pos] = self._visited.get(pos, 0) + 1
+        self.pos = pos
+        self.velocity = velocity
+
+    @property
+    def path(self):
+        """The Points the car visited so far, starting with the start.
+        """
+        return self._pathview
+
+    @path.setter
+    def path(self, path):
+        path = list(path)
+        if not path:
+            raise ValueError("path must not be empty.")
+        del self._positions[:]
+        del self._velocities[:]
+        self._visited.clear()
+        prev = None
+        for p in path:
+            if prev is None:
+                self._push(p, NullVector)
+            else:
+                self._push(p, p - prev)
+            prev = p
+
+    def hasVisited(self, p):
+        """True if the Point p is in the path of the car.
+        """
+        return p in self._visited
 
     def finished(self):
         """True if stopped in the finish.
         """
-        return self.pos == self.track.finish and self.velocity == Vector(0, 0)
+        return self.pos == self.track.finish and self.velocity == NullVector
 
     def move(self, n):
         """Make a move.  Raises an error if the move is not legal.
@@ -35,20 +125,85 @@ class Car(object):
         self.track.checkCollision(move)
         newvel = move.getVector()
         acceleration = newvel - self.velocity
-        if not self.accelerationRule.isAllowed(acceleration):
+        if not self.accelerationRule.isAllowed(acceleration, self.velocity):
             raise AccelerationNotAllowed(acceleration)
-        self.path.append(newpos)
-        self.pos = newpos
-        self.velocity = newvel
+        self._push(newpos, newvel)
+
+    def tryMove(self, n, collisionChecked=False):
+        """Make a move if it is legal.
+
+        Return MoveOk if the move has been made.  Otherwise return
+        MoveCollision or MoveAccelerationNotAllowed and leave the car
+        unchanged.  In contrast to move(), no exception is raised for
+        an illegal move.  If collisionChecked is True, the caller has
+        already made sure that the move does not collide, e.g. with
+        Track.checkCollisions(), and the move is not checked again.
+        """
+        pos = self.pos
+        if isinstance(n, Vector):
+            newpos = pos + n
+            newvel = n
+        elif isinstance(n, Point):
+            newpos = n
+            newvel = n - pos
+        else:
+            raise TypeError("move expects either a Point or a Vector.")
+        stats = self.stats
+        if stats is not None:
+            stats.movesTried += 1
+        if not self.accelerationRule.isAllowed(newvel - self.velocity,
+                                               self.velocity):
+            if stats is not None:
+                stats.accelRejected += 1
+            return self.MoveAccelerationNotAllowed
+        if (not collisionChecked and
+            self.track.findCollision(LineSegment(pos, newpos)) is not None):
+            if stats is not None:
+                stats.collisions += 1
+            return self.MoveCollision
+        self._push(newpos, newvel)
+        return self.MoveOk
+
+    def legalSuccessors(self, accelerations=None):
+        """Return the states that can be reached in one legal move.
+
+        Consider the current state of the car and each of the given
+        accelerations, by default all accelerations allowed by the
+        acceleration rule.  Return the list of tuples (pos, velocity)
+        of those successor states that are legal.  The car is not
+        moved.
+        """
+        pos = self.pos
+        velocity = self.velocity
+        table = self.accelerationRule.table(velocity)
+        if accelerations is None:
+            accelerations = table.accelerations
+        findCollision = self.track.findCollision
+        successors = []
+        for a in accelerations:
+            if a not in table:
+                continue
+            v = velocity + a
+            newpos = pos + v
+            if findCollision(LineSegment(pos, newpos)) is None:
+                successors.append( (newpos, v) )
+        return successors
 
     def reset(self, step):
         """Reset the car to an earlier position from its path.
         """
-        if not (0 <= step < len(self.path)):
+        positions = self._positions
+        if not (0 <= step < len(positions)):
             raise ValueError("Can not reset to step %d." % step)
-        self.path = self.path[:step+1]
-        self.pos = self.path[step]
-        if step > 0:
-            self.velocity = self.path[step] - self.path[step-1]
-        else:
-            self.velocity = Vector(0, 0)
+        visited = self._visited
+        for i in range(step+1, len(positions)):
+            p = positions[i]
+            c = visited[p] - 1
+            if c:
+                visited[p] = c
+            else:
+                del visited[p]
+        del positions[step+1:]
+        del self._velocities[step+1:]
+        self.pos = positions[step]
+        self.velocity = self._velocities[step]
@@ -0,0 +1,172 @@
+"""Save and restore the state of a ConstraintBacktrack search.
+
+A checkpoint holds the search stack, the current step, maxsteps, the
+best solution found so far and the path of the car.  All of these are
+stored as packed arrays of 32 bit integers in little endian byte
+order, so that writing a checkpoint is cheap even for large stacks.
+The TranspositionTable of the search is not saved, it only serves to
+speed up the search and starts empty on resume.
+
+A checkpoint file starts with a header of fixed size:
+
+    magic (4 bytes), version, width, height, start.x, start.y,
+    finish.x, finish.y, step, maxsteps, stack length, path length,
+    solution length, barrier digest (20 bytes), rule (64 bytes)
+
+where the fields from version to solution length are 32 bit
+integers.  maxsteps is -1 for no limit and the solution length is -1
+if there is no solution yet.  The barrier digest is the SHA-1 digest
+of the barriers of the track, see barrierDigest(), and rule the name
+of the acceleration rule of the car, padded with zero bytes.  A
+checkpoint is only loaded for a search on the same track with the
+same rule.  The header is followed by the stack as triples (step, dx,
+dy), the path and the solution as pairs (x, y).
+"""
+
+
+import os
+import struct
+import time
+import hashlib
+from fractions import Fraction
+from racetrack.linalg import *
+from racetrack.binfile import packInts, intArray
+
+
+Magic = b'RTCK'
+Version = 2
+_header = struct.Struct('<4s12i20s64s')
+
+
+def _flatten(points):
+    coords = []
+    for p in points:
+        coords.append(p.x)
+        coords.append(p.y)
+    return coords
+
+
+def _points(a):
+    return [ Point(a[i], a[i+1]) for i in range(0, len(a), 2) ]
+
+
+def barrierDigest(track):
+    """Return the SHA-1 digest of the barriers of track.
+
+    The digest does not depend on the order of the barriers or on the
+    type of their coordinates.  The borders of the track are not
+    included, they are given by the size of the track.
+    """
+    def number(v):
+        v = Fraction(v)
+        return str(v.numerator) if v.denominator == 1 else str(v)
+    lines = sorted(" ".join(number(v)
+                            for v in (b.p0.x, b.p0.y, b.p1.x, b.p1.y))
+                   for b in track.barriers[track._nborders:])
+    return hashlib.sha1("\n".join(lines).encode('ascii')).digest()
+
+
+def _ruleName(backtrack):
+    return backtrack.car.accelerationRule.__name__.encode('utf-8')[:64]
+
+
+def saveCheckpoint(backtrack, fname):
+    """Write the state of a ConstraintBacktrack to the file fname.
+
+    The file is written to a temporary file first and then renamed,
+    so that there is always a complete checkpoint.
+    """
+    track = backtrack.car.track
+    stack = []
+    for (step, d) in backtrack.stack:
+        stack.extend((step, d.x, d.y))
+    path = _flatten(backtrack.car.path)
+    solution = backtrack.solution
+    solution = _flatten(solution) if solution is not None else None
+    maxsteps = backtrack.maxsteps
+    header = _header.pack(Magic, Version, track.width, track.height,
+                          track.start.x, track.start.y,
+                          track.finish.x, track.finish.y,
+                          backtrack.step,
+                          -1 if maxsteps is None else maxsteps,
+                          len(backtrack.stack), len(path) // 2,
+                          -1 if solution is None else len(solution) // 2,
+                          barrierDigest(track), _ruleName(backtrack))
+    tmpname = fname + '.tmp'
+    with open(tmpname, 'wb') as f:
+        f.write(header)
+        f.write(packInts(stack))
+        f.write(packInts(path))
+        if solution is not None:
+            f.write(packInts(solution))
+    if os.name == 'nt' and os.path.exists(fname):
+        os.remove(fname)
+    os.rename(tmpname, fname)
+
+
+def loadCheckpoint(backtrack, fname):
+    """Restore the state of a ConstraintBacktrack from the file fname.
+
+    The car of backtrack must be on the same track and use the same
+    acceleration rule the checkpoint has been written for, otherwise
+    ValueError is raised.
+    """
+    with open(fname, 'rb') as f:
+        data = f.read()
+    if len(data) < _header.size:
+        raise ValueError("Checkpoint file is truncated.")
+    fields = _header.unpack(data[:_header.size])
+    (magic, version, width, height, sx, sy, fx, fy,
+     step, maxsteps, nstack, npath, nsolution, digest, rule) = fields
+    if magic != Magic:
+        raise ValueError("%s is not a checkpoint file." % fname)
+    if version != Version:
+        raise ValueError("Unsupported checkpoint version %d." % version)
+    track = backtrack.car.track
+    if ((width, height, Point(sx, sy), Point(fx, fy), digest) !=
+        (track.width, track.height, track.start, track.finish,
+         barrierDigest(track))):
+        raise ValueError("The checkpoint is for a different track.")
+    if rule.rstrip(b'\0') != _ruleName(backtrack):
+        raise ValueError("The checkpoint is for a different "
+                         "acceleration rule.")
+    offset = _header.size
+    stack = intArray(data, offset, 3*nstack, 'Checkpoint file')
+    offset += 4 * len(stack)
+    path = intArray(data, offset, 2*npath, 'Checkpoint file')
+    offset += 4 * len(path)
+    if nsolution >= 0:
+        solution = intArray(data, offset, 2*nsolution, 'Checkpoint file')
+        backtrack.solution = _points(solution)
+    else:
+        backtrack.solution = None
+    backtrack.stack = [ (stack[i], smallVector(stack[i+1], stack[i+2]))
+                        for i in range(0, len(stack), 3) ]
+    backtrack.car.path = _points(path)
+    backtrack.step = step
+    backtrack.maxsteps = None if maxsteps < 0 else maxsteps
+
+
+class Checkpointer(object):
+    """Periodically save the state of a ConstraintBacktrack.
+
+    Set the checkpointer attribute of a ConstraintBacktrack to an
+    instance of this class.  The search then calls tick() after each
+    search step, which writes a checkpoint to fname if at least
+    interval seconds have passed since the last one.
+    """
+
+    def __init__(self, backtrack, fname, interval=5.0):
+        self.backtrack = backtrack
+        self.fname = fname
+        self.interval = interval
+        self._next = time.time() + interval
+
+    def tick(self):
+        now = time.time()
+        if now >= self._next:
+            self.save()
+            self._next = time.time() + self.interval
+
+    def save(self):
+        saveCheckpoint(self.backtrack, self.fname)
@@ -1,4 +1,8 @@
 """Exception handling.
+
+The messages of the exceptions are only formatted when they are
+actually needed, since rule violations are raised and caught very
+often during a search.
 """
 
 class RuleViolationError(Exception):
@@ -9,24 +13,37 @@ class RuleViolationError(Exception):
 
 class CollisionError(RuleViolationError):
     """A move of the car caused a collision with a barrier.
+
+    The collision point is calculated on first access if it is not
+    given.
     """
-    def __init__(self, move, barrier, point):
+    def __init__(self, move, barrier, point=None):
+        super(CollisionError, self).__init__(move, barrier, point)
         self.move = move
         self.barrier = barrier
-        self.point = point
-        msg = ("Collision of move %s with barrier %s at point %s."
-               % (move, barrier, point))
-        super(CollisionError, self).__init__(msg)
+        self._point = point
+
+    @property
+    def point(self):
+        if self._point is None:
+            self._point = self.move & self.barrier
+        return self._point
+
+    def __str__(self):
+        return ("Collision of move %s with barrier %s at point %s."
+                % (self.move, self.barrier, self.point))
 
 
 class AccelerationNotAllowed(RuleViolationError):
     """A not permissible Acceleration.
     """
     def __init__(self, acceleration):
+        super(AccelerationNotAllowed, self).__init__(acceleration)
         self.acceleration = acceleration
-        msg = ("Acceleration %s is beyond permissible bounds." % 
-               (str(acceleration)))
-        super(AccelerationNotAllowed, self).__init__(msg)
+
+    def __str__(self):
+        return ("Acceleration %s is beyond permissible bounds." % 
+                (str(self.acceleration)))
 
 
 class NoSolutionError(Exception):
@@ -107,6 +107,47 @@ True
 True
 >>> LineSegment(p, p) & LineSegment(q, q) is None
 True
+>>> l1.intersects(l3)
+True
+>>> l1.intersects(l4)
+False
+>>> l1.intersects(LineSegment(Point(x=7, y=2), -Vector(x=2, y=1)))
+True
+>>> l1.intersects(LineSegment(Point(x=3, y=0), Vector(x=0, y=0)))
+True
+>>> LineSegment(Point(x=3, y=2), Vector(x=0, y=0)).intersects(l1)
+False
+>>> LineSegment(p, p).intersects(LineSegment(p, Vector(0,0)))
+True
+>>> LineSegment(p, p).intersects(LineSegment(q, q))
+False
+>>> smallVector(1, -1)
+Vector(x=1, y=-1)
+>>> smallVector(1, -1) is smallVector(1, -1)
+True
+>>> smallVector(0, 0) is NullVector
+True
+>>> uncheckedPoint(3, 4) + uncheckedVector(1, 1) == Point(4, 5)
+True
+>>> v == Point(x=2, y=6)
+False
+>>> len(set([Point(1, 2), Point(1, 2), Point(2, 1)]))
+2
+
+PointArray and SegmentArray hold many Points or LineSegments in NumPy
+arrays and allow vectorized operations on all of them at once.  They
+require NumPy to be installed.
+
+>>> l5 = LineSegment(Point(x=3, y=0), Vector(x=0, y=0))
+>>> moves = SegmentArray.fromSegments([l3, l4, l5])
+>>> len(moves)
+3
+>>> moves[1] == l4
+True
+>>> moves.intersects(SegmentArray.fromSegments([l1, l4])).tolist()
+[[True, False], [False, True], [True, False]]
+>>> moves.intersectsAny(SegmentArray.fromSegments([l4])).tolist()
+[False, True, False]
 
 Note: in the game, the positions of the race cars must be constraint
 to Points having integer coordinates.  But this is not enforced here,
@@ -119,9 +160,23 @@ from __future__ import division
 from numbers import Real
 from collections import namedtuple
 from math import fabs, sqrt
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
+__all__ = ['Vector', 'Point', 'LineSegment', 
+           'uncheckedVector', 'uncheckedPoint', 'smallVector', 'NullVector',
+           'PointArray', 'SegmentArray']
 
-__all__ = ['Vector', 'Point', 'LineSegment']
+
+# The arithmetic below is specialized for two coordinates and
+# constructs the result tuples directly, bypassing the type checks
+# in Vector.__new__() and Point.__new__().
+_tuple_new = tuple.__new__
+_tuple_eq = tuple.__eq__
+_tuple_ne = tuple.__ne__
 
 
 def sqr(x):
@@ -134,67 +189,65 @@ class Vector(namedtuple('Vector', ['x', 'y'])):
     """A Vector is the difference between two Ponts.
     """
 
+    __slots__ = ()
+
     def __new__(cls, x, y):
         if not isinstance(x, Real) or not isinstance(y, Real):
             raise TypeError("Vector coordinates must be real numbers.")
-        return super(Vector, cls).__new__(cls, x, y)
+        return _tuple_new(cls, (x, y))
 
     def __eq__(self, other):
         """self == other."""
         if isinstance(other, Vector):
-            for (s, o) in zip(self, other):
-                if s != o:
-                    return False
-            else:
-                return True
+            return _tuple_eq(self, other)
         else:
             return NotImplemented
 
     def __ne__(self, other):
         """self != other."""
         if isinstance(other, Vector):
-            for (s, o) in zip(self, other):
-                if s != o:
-                    return True
-            else:
-                return False
+            return _tuple_ne(self, other)
         else:
             return NotImplemented
 
+    __hash__ = tuple.__hash__
+
     def norm1(self):
         """one or taxicap norm."""
-        return sum(map(fabs, self))
+        return fabs(self[0]) + fabs(self[1])
 
     def norm2(self):
         """two or Euclidean norm."""
-        return sqrt(sum(map(sqr, self)))
+        x = self[0]
+        y = self[1]
+        return sqrt(x*x + y*y)
 
     def norminf(self):
         """infinity or maximum norm."""
-        return max(map(fabs, self))
+        return max(fabs(self[0]), fabs(self[1]))
 
     def __neg__(self):
         """-self."""
-        return Vector._make([-c for c in self])
+        return _tuple_new(Vector, (-self[0], -self[1]))
 
     def __add__(self, other):
         """sum of two Vectors."""
         if isinstance(other, Vector):
-            return Vector._make(map(sum, zip(self, other)))
+            return _tuple_new(Vector, (self[0] + other[0], self[1] + other[1]))
         else:
             return NotImplemented
 
     def __sub__(self, other):
         """difference between two Vectors."""
         if isinstance(other, Vector):
-            return self + -other
+            return _tuple_new(Vector, (self[0] - other[0], self[1] - other[1]))
         else:
             return NotImplemented
 
     def __rmul__(self, other):
         """scalar*Vector."""
         if isinstance(other, Real):
-            return Vector._make([other*c for c in self])
+            return _tuple_new(Vector, (other * self[0], other * self[1]))
         else:
             return NotImplemented
 
@@ -203,37 +256,33 @@ class Point(namedtuple('Point', ['x', 'y'])):
     """A Point in the space.
     """
 
+    __slots__ = ()
+
     def __new__(cls, x, y):
         if not isinstance(x, Real) or not isinstance(y, Real):
             raise TypeError("Point coordinates must be real numbers.")
-        return super(Point, cls).__new__(cls, x, y)
+        return _tuple_new(cls, (x, y))
 
     def __eq__(self, other):
         """self == other."""
         if isinstance(other, Point):
-            for (s, o) in zip(self, other):
-                if s != o:
-                    return False
-            else:
-                return True
+            return _tuple_eq(self, other)
         else:
             return NotImplemented
 
     def __ne__(self, other):
         """self != other."""
         if isinstance(other, Point):
-            for (s, o) in zip(self, other):
-                if s != o:
-                    return True
-            else:
-                return False
+            return _tuple_ne(self, other)
         else:
             return NotImplemented
 
+    __hash__ = tuple.__hash__
+
     def __add__(self, other):
         """sum of Point and Vector."""
         if isinstance(other, Vector):
-            return Point._make(map(sum, zip(self, other)))
+            return _tuple_new(Point, (self[0] + other[0], self[1] + other[1]))
         else:
             return NotImplemented
 
@@ -242,19 +291,57 @@ class Point(namedtuple('Point', ['x', 'y'])):
         The difference between a Point and a Vector is a Point.
         The difference between two Points is a Vector."""
         if isinstance(other, Vector):
-            return self + -other
+            return _tuple_new(Point, (self[0] - other[0], self[1] - other[1]))
         elif isinstance(other, Point):
-            return Vector._make([(s - o) for (s, o) in zip(self, other)])
+            return _tuple_new(Vector, (self[0] - other[0], self[1] - other[1]))
         else:
             return NotImplemented
 
     def isIntegral(self):
         """Return True if all coordinates are integral numbers."""
-        for c in self:
-            if not c == int(c):
-                return False
-        else:
-            return True
+        x = self[0]
+        y = self[1]
+        return x == int(x) and y == int(y)
+
+
+def uncheckedVector(x, y):
+    """Create a Vector without checking the type of the coordinates.
+
+    This is intended for internal hot loops, where the coordinates
+    are known to be real numbers.
+    """
+    return _tuple_new(Vector, (x, y))
+
+
+def uncheckedPoint(x, y):
+    """Create a Point without checking the type of the coordinates.
+
+    This is intended for internal hot loops, where the coordinates
+    are known to be real numbers.
+    """
+    return _tuple_new(Point, (x, y))
+
+
+# Shared instances of Vectors with small integral coordinates.  These
+# are used over and over again as unit directions and accelerations.
+SmallVectorRange = 10
+_smallVectors = dict(((x, y), _tuple_new(Vector, (x, y)))
+                     for x in range(-SmallVectorRange, SmallVectorRange+1)
+                     for y in range(-SmallVectorRange, SmallVectorRange+1))
+NullVector = _smallVectors[0, 0]
+
+
+def smallVector(x, y):
+    """Return a Vector with integral coordinates.
+
+    For coordinates not larger then SmallVectorRange in magnitude,
+    always the same shared instance is returned.
+    """
+    if type(x) is int and type(y) is int:
+        v = _smallVectors.get((x, y))
+        if v is not None:
+            return v
+    return Vector(x, y)
 
 
 class LineSegment(object):
@@ -353,6 +440,41 @@ class LineSegment(object):
                 # All four points coincide.
                 return self.p0
 
+    def intersects(self, other):
+        """True if the two LineSegments have at least one point in common.
+
+        This is equivalent to (self & other) is not None, but it does
+        not calculate the intersection point.  Only orientation tests
+        based on cross products are used, so the result is exact for
+        integral coordinates.
+        """
+        (ax, ay) = self.p0
+        (bx, by) = self.p1
+        (cx, cy) = other.p0
+        (dx, dy) = other.p1
+        # Orientation of other.p0 and other.p1 with respect to self.
+        ux = bx - ax
+        uy = by - ay
+        o1 = ux * (cy - ay) - uy * (cx - ax)
+        o2 = ux * (dy - ay) - uy * (dx - ax)
+        if (o1 > 0 and o2 > 0) or (o1 < 0 and o2 < 0):
+            return False
+        # Orientation of self.p0 and self.p1 with respect to other.
+        vx = dx - cx
+        vy = dy - cy
+        o3 = vx * (ay - cy) - vy * (ax - cx)
+        o4 = vx * (by - cy) - vy * (bx - cx)
+        if (o3 > 0 and o4 > 0) or (o3 < 0 and o4 < 0):
+            return False
+        if o1 == 0 and o2 == 0 and o3 == 0 and o4 == 0:
+            # Collinear or degenerated segments: they intersect if
+            # and only if their bounding boxes overlap.
+            return (min(ax, bx) <= max(cx, dx) and
+                    min(cx, dx) <= max(ax, bx) and
+                    min(ay, by) <= max(cy, dy) and
+                    min(cy, dy) <= max(ay, by))
+        return True
+
     def getVector(self):
         """Return the Vector from start to end Point."""
         return self.p1 - self.p0
@@ -360,3 +482,154 @@ class LineSegment(object):
     def isIntegral(self):
         """Return True if both start and end point are integral."""
         return self.p0.isIntegral() and self.p1.isIntegral()
+
+
+class PointArray(object):
+    """An array of Points backed by a NumPy array of shape (n, 2).
+    """
+
+    def __init__(self, points):
+        if numpy is None:
+            raise ImportError("PointArray requires NumPy.")
+        a = numpy.asarray(points)
+        if a.size == 0:
+            a = numpy.zeros((0, 2), dtype=numpy.int64)
+        if a.ndim != 2 or a.shape[1] != 2:
+            raise ValueError("points must have shape (n, 2).")
+        if a.dtype.kind in 'iub':
+            a = a.astype(numpy.int64, copy=False)
+        elif a.dtype.kind == 'f':
+            pass
+        else:
+            raise TypeError("Point coordinates must be real numbers.")
+        self.coords = a
+
+    @property
+    def x(self):
+        return self.coords[:,0]
+
+    @property
+    def y(self):
+        return self.coords[:,1]
+
+    def __len__(self):
+        return len(self.coords)
+
+    def __getitem__(self, i):
+        (x, y) = self.coords[i].tolist()
+        return Point(x, y)
+
+    def __iter__(self):
+        for (x, y) in self.coords.tolist():
+            yield Point(x, y)
+
+    def __repr__(self):
+        return "PointArray(%s)" % self.coords.tolist()
+
+
+class SegmentArray(object):
+    """An array of LineSegments.
+
+    The start and end points are held in two PointArrays p0 and p1
+    of equal length.
+    """
+
+    # Upper limit for the number of segment pairs that are tested at
+    # once in intersectsAny().  This bounds the size of temporary
+    # arrays.
+    BlockSize = 1 << 20
+
+    def __init__(self, p0, p1):
+        if not isinstance(p0, PointArray):
+            p0 = PointArray(p0)
+        if not isinstance(p1, PointArray):
+            p1 = PointArray(p1)
+        if len(p0) != len(p1):
+            raise ValueError("start and end points must have equal length.")
+        self.p0 = p0
+        self.p1 = p1
+
+    @classmethod
+    def fromSegments(cls, segments):
+        """Create a SegmentArray from a sequence of LineSegments.
+        """
+        p0 = [l.p0 for l in segments]
+        p1 = [l.p1 for l in segments]
+        return cls(PointArray(p0), PointArray(p1))
+
+    def __len__(self):
+        return len(self.p0)
+
+    def __getitem__(self, i):
+        return LineSegment(self.p0[i], self.p1[i])
+
+    def __iter__(self):
+        for (p0, p1) in zip(self.p0, self.p1):
+            yield LineSegment(p0, p1)
+
+    def __repr__(self):
+        return "SegmentArray(%s, %s)" % (self.p0, self.p1)
+
+    def intersects(self, other):
+        """Test all pairs of segments from self and other for intersection.
+
+        Return a boolean array of shape (len(self), len(other)).  The
+        element [i, j] is self[i].intersects(other[j]).
+        """
+        return _intersects(self.p0.coords[:,None,:], self.p1.coords[:,None,:],
+                           other.p0.coords[None,:,:],
+                           other.p1.coords[None,:,:])
+
+    def intersectsPairwise(self, other):
+        """Test the segments of self and other of the same index for
+        intersection.
+
+        Return a boolean array of length len(self).  The element i is
+        self[i].intersects(other[i]).
+        """
+        if len(self) != len(other):
+            raise ValueError("segment arrays must have equal length.")
+        return _intersects(self.p0.coords, self.p1.coords,
+                           other.p0.coords, other.p1.coords)
+
+    def intersectsAny(self, other):
+        """Test each segment in self for intersection with any in other.
+
+        Return a boolean array of length len(self).
+        """
+        n = len(self)
+        m = len(other)
+        result = numpy.zeros(n, dtype=bool)
+        if n == 0 or m == 0:
+            return result
+        rows = max(1, self.BlockSize // m)
+        for i in range(0, n, rows):
+            block = SegmentArray(PointArray(self.p0.coords[i:i+rows]), 
+                                 PointArray(self.p1.coords[i:i+rows]))
+            result[i:i+rows] = block.intersects(other).any(axis=1)
+        return result
+
+
+def _intersects(a, b, c, d):
+    # Test the segments from a to b for intersection with the segments
+    # from c to d, all given as coordinate arrays with the coordinates
+    # in the last axis and broadcast against each other.
+    (ax, ay) = (a[...,0], a[...,1])
+    (bx, by) = (b[...,0], b[...,1])
+    (cx, cy) = (c[...,0], c[...,1])
+    (dx, dy) = (d[...,0], d[...,1])
+    ux = bx - ax
+    uy = by - ay
+    o1 = numpy.sign(ux * (cy - ay) - uy * (cx - ax))
+    o2 = numpy.sign(ux * (dy - ay) - uy * (dx - ax))
+    vx = dx - cx
+    vy = dy - cy
+    o3 = numpy.sign(vx * (ay - cy) - vy * (ax - cx))
+    o4 = numpy.sign(vx * (by - cy) - vy * (bx - cx))
+    crossing = (o1 * o2 <= 0) & (o3 * o4 <= 0)
+    collinear = (o1 == 0) & (o2 == 0) & (o3 == 0) & (o4 == 0)
+    overlap = ((numpy.minimum(ax, bx) <= numpy.maximum(cx, dx)) &
+               (numpy.minimum(cx, dx) <= numpy.maximum(ax, bx)) &
+               (numpy.minimum(ay, by) <= numpy.maximum(cy, dy)) &
+               (numpy.minimum(cy, dy) <= numpy.maximum(ay, by)))
+    return crossing & (overlap | ~collinear)
@@ -0,0 +1,173 @@
+"""Precompute the legal moves on a track.
+
+A MoveGraph holds all states of the car, i.e. the tuples (pos,
+velocity), that can be reached from a set of starting points on a
+track, together with the legal moves between them.  The states are
+numbered by integer ids, the moves are stored in compressed sparse row
+form: the successors of the state with id s are the ids in
+targets[offsets[s]:offsets[s+1]].  Once the graph is built, solvers
+may walk it without any geometry.
+
+Note that a move to a state (pos, velocity) is always made from the
+position pos - velocity.  So whether a state can be entered without
+collision is a property of the state alone and each state needs to be
+checked only once.
+
+>>> from racetrack.track import Track
+>>> track = Track(10, 5, Point(1, 1), Point(9, 1),
+...               [LineSegment(Point(5, 0), Point(5, 3))])
+>>> graph = MoveGraph(track, maxspeed=4)
+>>> s = graph.stateId(Point(1, 1), NullVector)
+>>> [ graph.state(t)[0] for t in graph.successors(s) ]
+[Point(x=1, y=1), Point(x=1, y=2), Point(x=2, y=1), Point(x=2, y=2)]
+>>> path = graph.shortestPath(track.start)
+>>> len(path) - 1
+8
+"""
+
+
+from array import array
+from collections import deque
+from racetrack.linalg import *
+from racetrack.rules import EightNeighboursRule
+from racetrack.exception import NoSolutionError
+
+
+class MoveGraph(object):
+    """The graph of legal moves on a track.
+
+    The graph contains all states reachable from the starting points
+    in starts, each at rest, that have a speed of at most maxspeed in
+    the maximum norm.  starts defaults to the start of the track.  The
+    accelerations are those allowed by the AccelerationRule rule, which
+    may depend on the velocity.
+
+    The states are numbered in breadth first order, so that the
+    starting points get the lowest ids.  The positions and velocities
+    of the states are kept in the arrays posx, posy, velx, and vely,
+    indexed by the state id.
+    """
+
+    def __init__(self, track, rule=EightNeighboursRule, maxspeed=10,
+                 starts=None):
+        self.track = track
+        self.rule = rule
+        self.maxspeed = maxspeed
+        if starts is None:
+            starts = [ track.start ]
+        self.posx = array('i')
+        self.posy = array('i')
+        self.velx = array('i')
+        self.vely = array('i')
+        self.offsets = array('l', [0])
+        self.targets = array('i')
+        self._ids = {}
+        self._build(starts)
+
+    def _addState(self, pos, velocity):
+        s = len(self.posx)
+        self._ids[pos, velocity] = s
+        self.posx.append(pos.x)
+        self.posy.append(pos.y)
+        self.velx.append(velocity.x)
+        self.vely.append(velocity.y)
+        return s
+
+    def _build(self, starts):
+        ids = self._ids
+        findCollision = self.track.findCollision
+        maxspeed = self.maxspeed
+        accelerations = self.rule.accelerations
+        targets = self.targets
+        offsets = self.offsets
+        # States that can not be entered without collision.
+        blocked = set()
+        for p in starts:
+            if (p, NullVector) not in ids:
+                self._addState(p, NullVector)
+        # The states are expanded in the order of their ids, such that
+        # their successor lists are appended in order.
+        s = 0
+        while s < len(self.posx):
+            pos = Point(self.posx[s], self.posy[s])
+            velocity = Vector(self.velx[s], self.vely[s])
+            for a in accelerations(velocity):
+                v = velocity + a
+                if max(abs(v.x), abs(v.y)) > maxspeed:
+                    continue
+                newpos = pos + v
+                state = (newpos, v)
+                t = ids.get(state)
+                if t is None:
+                    if state in blocked:
+                        continue
+                    if findCollision(LineSegment(pos, newpos)) is not None:
+                        blocked.add(state)
+                        continue
+                    t = self._addState(newpos, v)
+                targets.append(t)
+            offsets.append(len(targets))
+            s += 1
+
+    def __len__(self):
+        return len(self.posx)
+
+    def stateId(self, pos, velocity):
+        """Return the id of the state (pos, velocity).
+
+        Return None if the state is not in the graph.
+        """
+        return self._ids.get((pos, velocity))
+
+    def state(self, s):
+        """Return the state with id s as tuple (pos, velocity).
+        """
+        return (Point(self.posx[s], self.posy[s]),
+                Vector(self.velx[s], self.vely[s]))
+
+    def successors(self, s):
+        """Return the ids of the successors of the state with id s.
+        """
+        return self.targets[self.offsets[s]:self.offsets[s+1]]
+
+    def numMoves(self):
+        """Return the number of moves in the graph.
+        """
+        return len(self.targets)
+
+    def shortestPath(self, pos, velocity=NullVector):
+        """Return an optimal path from the state (pos, velocity) to the
+        finish as list of Points, starting with pos.
+
+        Note that the path only contains states with a speed of at
+        most maxspeed.  Raise NoSolutionError if the finish can not be
+        reached in the graph.
+        """
+        start = self.stateId(pos, velocity)
+        goal = self.stateId(self.track.finish, NullVector)
+        if start is None or goal is None:
+            raise NoSolutionError()
+        offsets = self.offsets
+        targets = self.targets
+        parent = array('i', [-1]) * len(self)
+        parent[start] = start
+        queue = deque([start])
+        while queue:
+            s = queue.popleft()
+            if s == goal:
+                break
+            for k in range(offsets[s], offsets[s+1]):
+                t = targets[k]
+                if parent[t] < 0:
+                    parent[t] = s
+                    queue.append(t)
+        else:
+            raise NoSolutionError()
+        path = []
+        s = goal
+        while s != start:
+            path.append(Point(self.posx[s], self.posy[s]))
+            s = parent[s]
+        path.append(pos)
+        path.reverse()
+        return path
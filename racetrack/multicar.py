@@ -0,0 +1,227 @@
+"""Simulate many cars in lockstep.
+
+In contrast to racetrack.car.Car, which models a single car with its
+full path, MultiCarRace holds only the current positions and
+velocities of a number of cars in NumPy arrays and advances all of
+them in one vectorized step.  The cars may take part in several
+independent races on the same track at once, this allows to simulate
+many bot races in one go.
+
+>>> from racetrack.track import Track
+>>> track = Track(10, 5, Point(1, 1), Point(9, 1),
+...               [LineSegment(Point(5, 0), Point(5, 3))])
+>>> race = MultiCarRace(track, 3, races=[0, 0, 1])
+>>> race.move([[1, 1], [1, 1], [1, 0]])
+1
+>>> race.status.tolist()
+[2, 2, 0]
+>>> race.pos.tolist()
+[[1, 1], [1, 1], [2, 1]]
+>>> race.move([[0, 0], [0, 0], [1, 0]])
+1
+>>> race.move([[0, 0], [0, 0], [2, 0]])
+0
+>>> race.status.tolist()
+[2, 2, 3]
+
+The first two cars in race 0 crashed into each other, the third car
+was disqualified for an illegal acceleration.
+"""
+
+
+from racetrack.linalg import *
+from racetrack.linalg import numpy
+from racetrack.rules import EightNeighboursRule
+
+
+class MultiCarRace(object):
+    """A number of cars racing on a track in lockstep.
+
+    The state of the cars is held in NumPy arrays indexed by the number
+    of the car: pos and vel of shape (ncars, 2) with the positions and
+    velocities, race with the number of the race each car takes part
+    in, status with the status of each car, and steps with the number
+    of moves made by each car.  The status is one of:
+
+    Racing
+        The car is still racing.
+    Finished
+        The car came to rest in the finish.  It does not take part in
+        the race any further.
+    Crashed
+        The car collided with a barrier or with another car.  It
+        stays at its last position but is out of the race.
+    Disqualified
+        The car tried an acceleration not allowed by the rule.
+
+    All cars start at rest, at the start of the track by default or at
+    the points given in starts.  races defaults to all cars taking
+    part in race 0.
+
+    If carCollision is 'occupancy', cars of the same race that end
+    their move in the same position crash.  If it is 'none', cars do
+    not interact.
+    """
+
+    Racing = 0
+    Finished = 1
+    Crashed = 2
+    Disqualified = 3
+
+    CarCollisionRules = ('none', 'occupancy')
+
+    def __init__(self, track, ncars, rule=EightNeighboursRule, races=None,
+                 starts=None, carCollision='occupancy'):
+        if numpy is None:
+            raise ImportError("MultiCarRace requires NumPy.")
+        if carCollision not in self.CarCollisionRules:
+            raise ValueError("Invalid carCollision %r." % carCollision)
+        self.track = track
+        self.ncars = ncars
+        self.rule = rule
+        self.carCollision = carCollision
+        self.pos = numpy.empty((ncars, 2), dtype=numpy.int64)
+        self.pos[:] = track.start if starts is None else starts
+        self.vel = numpy.zeros((ncars, 2), dtype=numpy.int64)
+        if races is None:
+            self.race = numpy.zeros(ncars, dtype=numpy.int64)
+        else:
+            self.race = numpy.array(races, dtype=numpy.int64)
+        self.status = numpy.zeros(ncars, dtype=numpy.int8)
+        self.steps = numpy.zeros(ncars, dtype=numpy.int64)
+        self.step = 0
+        self._finish = numpy.array(track.finish, dtype=numpy.int64)
+
+    def racing(self):
+        """Return the numbers of the cars still racing.
+        """
+        return numpy.flatnonzero(self.status == self.Racing)
+
+    def move(self, accel):
+        """Advance all racing cars by one move.
+
+        accel is an integer array of shape (ncars, 2) with the
+        acceleration of each car.  The entries for cars not racing
+        are ignored.  Return the number of cars still racing after the
+        move.
+        """
+        accel = numpy.asarray(accel, dtype=numpy.int64)
+        idx = self.racing()
+        allowed = self.rule.areAllowed(accel[idx], self.vel[idx])
+        self.status[idx[~allowed]] = self.Disqualified
+        idx = idx[allowed]
+
+        vel = self.vel[idx] + accel[idx]
+        p0 = self.pos[idx]
+        p1 = p0 + vel
+        crashed = self.track.checkCollisions(SegmentArray(p0, p1))
+        if self.carCollision == 'occupancy':
+            crashed |= self._occupancyCrashes(self.race[idx], p1, crashed)
+
+        ok = ~crashed
+        self.status[idx[crashed]] = self.Crashed
+        idx = idx[ok]
+        self.pos[idx] = p1[ok]
+        self.vel[idx] = vel[ok]
+        self.steps[idx] += 1
+        done = ((self.pos[idx] == self._finish).all(axis=1) &
+                (self.vel[idx] == 0).all(axis=1))
+        self.status[idx[done]] = self.Finished
+        self.step += 1
+        return int((self.status == self.Racing).sum())
+
+    def _occupancyCrashes(self, race, p1, crashed):
+        # Find the moves among those not crashed into a barrier that
+        # end in the same position as another one of the same race.
+        keys = numpy.column_stack((race, p1))
+        keys = keys[~crashed]
+        result = numpy.zeros(len(p1), dtype=bool)
+        if len(keys) < 2:
+            return result
+        (uniq, inverse, counts) = numpy.unique(keys, axis=0,
+                                               return_inverse=True,
+                                               return_counts=True)
+        result[numpy.flatnonzero(~crashed)] = counts[inverse.ravel()] > 1
+        return result
+
+    def candidates(self):
+        """Return the accelerations of the racing cars that do not
+        lead into a barrier.
+
+        Return a tuple (accel, mask), accel being an integer array of
+        shape (k, 2) of all accelerations that may be allowed by the
+        rule and mask a boolean array of shape (ncars, k).  The
+        element mask[i, j] is True if car i is racing, the
+        acceleration accel[j] is allowed at its velocity and the
+        resulting move does not collide with a barrier.  Collisions
+        with other cars are not considered.
+        """
+        accel = numpy.array(self.rule.allAccelerations(), dtype=numpy.int64)
+        k = len(accel)
+        mask = numpy.zeros((self.ncars, k), dtype=bool)
+        idx = self.racing()
+        if len(idx) == 0 or k == 0:
+            return (accel, mask)
+        n = len(idx)
+        vel = numpy.repeat(self.vel[idx], k, axis=0)
+        a = numpy.tile(accel, (n, 1))
+        allowed = self.rule.areAllowed(a, vel)
+        p0 = numpy.repeat(self.pos[idx], k, axis=0)
+        p1 = p0 + vel + a
+        ok = allowed
+        ok[allowed] = ~self.track.checkCollisions(SegmentArray(p0[allowed],
+                                                               p1[allowed]))
+        mask[idx] = ok.reshape(n, k)
+        return (accel, mask)
+
+    def run(self, policy, maxsteps=1000):
+        """Run the race until no car is racing any more, but at most for
+        maxsteps moves.
+
+        policy is called with the MultiCarRace as argument before each
+        move and must return the accelerations of all cars.
+        """
+        while self.step < maxsteps and (self.status == self.Racing).any():
+            self.move(policy(self))
+
+    def results(self):
+        """Return the number of cars in each status as dict.
+        """
+        names = ('racing', 'finished', 'crashed', 'disqualified')
+        counts = numpy.bincount(self.status, minlength=len(names))
+        return dict(zip(names, counts.tolist()))
+
+
+def chooseCandidates(accel, mask, rnd, weights=None):
+    """Randomly choose one acceleration for each car.
+
+    accel and mask are as returned by MultiCarRace.candidates().  For
+    each car, one of the accelerations with True in mask is chosen,
+    with a probability proportional to weights, if given, a float
+    array of the shape of mask.  If no acceleration is left for a
+    car, any one is chosen.  rnd is a numpy.random.RandomState.
+    """
+    (n, k) = mask.shape
+    if weights is None:
+        score = rnd.random_sample((n, k))
+    else:
+        # Weighted sampling with exponential keys.
+        score = rnd.random_sample((n, k)) ** (1.0 / numpy.maximum(weights,
+                                                                  1e-12))
+    score[~mask] = -1.0
+    choice = score.argmax(axis=1)
+    stuck = ~mask.any(axis=1)
+    if stuck.any():
+        choice[stuck] = rnd.randint(0, k, stuck.sum())
+    return accel[choice]
+
+
+def randomPolicy(seed=None):
+    """Return a policy for MultiCarRace.run() choosing random
+    accelerations among those that do not lead into a barrier.
+    """
+    rnd = numpy.random.RandomState(seed)
+    def policy(race):
+        (accel, mask) = race.candidates()
+        return chooseCandidates(accel, mask, rnd)
+    return policy
@@ -0,0 +1,171 @@
+"""Run a ConstraintBacktrack search on several processes.
+
+The search tree is split by the prefixes of the path: all legal paths
+with a given number of moves extending the current path of the car
+are enumerated and each of them is searched by a ConstraintBacktrack
+in a pool of worker processes.  The workers share the maximum number
+of steps, so that a solution found in one worker immediately tightens
+the bound in all the others.
+"""
+
+
+import multiprocessing
+from racetrack.car import Car
+from racetrack.backtrack import ConstraintBacktrack, TranspositionTable
+from racetrack.exception import NoSolutionError
+
+
+def legalPrefixes(car, depth):
+    """Enumerate all legal extensions of the path of the car by depth
+    moves.
+
+    Return a tuple (prefixes, solutions) of two lists of paths, each
+    path being a list of Points.  Paths that reach the finish in at
+    most depth moves are returned in solutions and not extended any
+    further.  The car is reset to its initial state at the end.
+    """
+    step0 = len(car.path) - 1
+    rule = car.accelerationRule
+    prefixes = []
+    solutions = []
+    stack = [ (step0, a) for a in rule.accelerations(car.velocity) ]
+    if car.finished():
+        solutions.append(list(car.path))
+        stack = []
+    while stack:
+        (step, a) = stack.pop()
+        car.reset(step)
+        if car.tryMove(car.velocity + a) != Car.MoveOk:
+            continue
+        if car.finished():
+            solutions.append(list(car.path))
+        elif step + 1 - step0 < depth:
+            stack.extend( (step + 1, b)
+                          for b in rule.accelerations(car.velocity) )
+        else:
+            prefixes.append(list(car.path))
+    car.reset(step0)
+    return (prefixes, solutions)
+
+
+class _SharedBound(object):
+    """Descriptor that keeps maxsteps in a shared memory value.
+
+    None is represented as -1.  The value may only decrease.
+    """
+
+    def __get__(self, obj, objtype=None):
+        v = obj.bound.value
+        return None if v < 0 else v
+
+    def __set__(self, obj, value):
+        bound = obj.bound
+        with bound.get_lock():
+            if value is not None and (bound.value < 0 or
+                                      value < bound.value):
+                bound.value = value
+
+
+class SharedBoundBacktrack(ConstraintBacktrack):
+    """A ConstraintBacktrack with maxsteps in shared memory.
+    """
+
+    maxsteps = _SharedBound()
+
+    def __init__(self, car, bound, distfield=None, table=None):
+        self.bound = bound
+        super(SharedBoundBacktrack, self).__init__(car, maxsteps=None,
+                                                   distfield=distfield,
+                                                   table=table)
+
+
+# The state of a worker process, set by _initWorker().
+_worker = {}
+
+def _initWorker(bound, track, rule, distfield, tablesize):
+    _worker['bound'] = bound
+    _worker['track'] = track
+    _worker['rule'] = rule
+    _worker['distfield'] = distfield
+    _worker['tablesize'] = tablesize
+
+def _searchPrefix(prefix):
+    car = Car(_worker['track'])
+    car.accelerationRule = _worker['rule']
+    car.path = prefix
+    tablesize = _worker['tablesize']
+    table = TranspositionTable(tablesize) if tablesize else None
+    backtrack = SharedBoundBacktrack(car, _worker['bound'],
+                                     distfield=_worker['distfield'],
+                                     table=table)
+    try:
+        backtrack.search()
+    except NoSolutionError:
+        return None
+    return backtrack.solution
+
+
+class ParallelBacktrack(object):
+    """Search an optimal solution with ConstraintBacktrack in parallel.
+
+    The path of the car is extended by all legal prefixes of depth
+    moves, these are searched in a pool of processes.  processes
+    defaults to the number of CPUs.  distfield and tablesize are
+    passed on to the ConstraintBacktrack in the workers, tablesize
+    being the maxsize of a TranspositionTable or None for no table.
+    """
+
+    def __init__(self, car, maxsteps=None, depth=2, processes=None,
+                 distfield=None, tablesize=1000000):
+        self.car = car
+        self.maxsteps = maxsteps
+        self.depth = depth
+        self.processes = processes
+        self.distfield = distfield
+        self.tablesize = tablesize
+        self.solution = None
+
+    def _prefixKey(self, prefix):
+        # Search the most promising prefixes first.
+        p = prefix[-1]
+        if self.distfield is not None:
+            d = self.distfield.distance(p)
+            if d is not None:
+                return d
+        return (self.car.track.finish - p).norm2()
+
+    def search(self):
+        """Search an optimal solution and set the path of the car to it.
+
+        Raise NoSolutionError if no solution is found within maxsteps.
+        """
+        (prefixes, solutions) = legalPrefixes(self.car, self.depth)
+        best = None
+        for s in solutions:
+            if best is None or len(s) < len(best):
+                best = s
+        maxsteps = self.maxsteps
+        if best is not None:
+            if maxsteps is None or len(best) - 1 <= maxsteps:
+                maxsteps = len(best) - 2
+            else:
+                best = None
+        if maxsteps is not None:
+            prefixes = [ p for p in prefixes if len(p) - 1 <= maxsteps ]
+        prefixes.sort(key=self._prefixKey)
+        bound = multiprocessing.Value('l', -1 if maxsteps is None
+                                      else maxsteps)
+        initargs = (bound, self.car.track, self.car.accelerationRule,
+                    self.distfield, self.tablesize)
+        pool = multiprocessing.Pool(self.processes, _initWorker, initargs)
+        try:
+            for s in pool.imap_unordered(_searchPrefix, prefixes):
+                if s is not None and (best is None or len(s) < len(best)):
+                    best = s
+        finally:
+            pool.terminate()
+            pool.join()
+        if best is None:
+            raise NoSolutionError()
+        self.solution = best
+        self.car.path = best
@@ -0,0 +1,275 @@
+"""Estimate the value of a state by random playouts.
+
+A rollout plays many games at once from the same position and
+velocity of the car, choosing the accelerations at random or by a
+policy, and collects how the games ended.  The games are played by a
+MultiCarRace, one car per game, so that all of them are advanced with
+a few array operations per step.
+
+>>> from racetrack.track import Track
+>>> track = Track(10, 5, Point(1, 1), Point(9, 1),
+...               [LineSegment(Point(5, 0), Point(5, 3))])
+>>> stats = rollout(track, Point(1, 1), n=200, maxsteps=50, seed=1,
+...                 policy=distancePolicy(track, seed=1))
+>>> stats.n == stats.finished + stats.crashed + stats.unfinished
+True
+>>> stats.minSteps()
+8
+
+The policy follows the acceleration rule of the rollout:
+
+>>> from racetrack.rules import EuclideanTenRule
+>>> stats = rollout(track, Point(1, 1), n=200, maxsteps=50, seed=1,
+...                 rule=EuclideanTenRule, policy=distancePolicy(track, seed=1))
+>>> (stats.minSteps(), stats.crashed)
+(3, 0)
+
+The car may also be rolled out while moving:
+
+>>> stats = rollout(track, Point(3, 1), Vector(2, 0), n=100, seed=1)
+>>> stats.crashRate()
+1.0
+
+The distance guided policy avoids moves after which the car can not
+stop in time any more, so it also gets around the sharp bends of the
+track from the c't magazine:
+
+>>> from racetrack.bench import ctTrack
+>>> track = ctTrack()
+>>> stats = rollout(track, track.start, n=50, maxsteps=300,
+...                 policy=distancePolicy(track, temperature=0.3, seed=1))
+>>> (stats.finishRate() > 0.5, stats.crashed)
+(True, 0)
+"""
+
+
+from racetrack.linalg import *
+from racetrack.linalg import numpy
+from racetrack.rules import EightNeighboursRule
+from racetrack.multicar import MultiCarRace, chooseCandidates, randomPolicy
+
+
+class RolloutStats(object):
+    """The outcome of the games of a rollout.
+
+    n is the number of games.  finished, crashed, and disqualified are
+    the numbers of games that ended in the finish, with a collision,
+    or with an illegal acceleration respectively, unfinished the number
+    of games still running when the step limit was reached.  steps is
+    an integer NumPy array with the number of moves of each finished
+    game.
+    """
+
+    def __init__(self, race):
+        self.n = race.ncars
+        counts = race.results()
+        self.finished = counts['finished']
+        self.crashed = counts['crashed']
+        self.disqualified = counts['disqualified']
+        self.unfinished = counts['racing']
+        self.steps = race.steps[race.status == race.Finished]
+
+    def finishRate(self):
+        """Return the fraction of the games that finished.
+        """
+        return float(self.finished) / self.n if self.n else 0.0
+
+    def crashRate(self):
+        """Return the fraction of the games that ended with a collision.
+        """
+        return float(self.crashed) / self.n if self.n else 0.0
+
+    def meanSteps(self):
+        """Return the average number of moves of the finished games, or
+        None if no game finished.
+        """
+        if not self.finished:
+            return None
+        return float(self.steps.mean())
+
+    def minSteps(self):
+        """Return the number of moves of the shortest finished game, or
+        None if no game finished.
+        """
+        if not self.finished:
+            return None
+        return int(self.steps.min())
+
+    def asDict(self):
+        """Return the statistics as dict.
+        """
+        return { 'n': self.n, 'finished': self.finished,
+                 'crashed': self.crashed, 'disqualified': self.disqualified,
+                 'unfinished': self.unfinished,
+                 'finishRate': self.finishRate(),
+                 'crashRate': self.crashRate(),
+                 'meanSteps': self.meanSteps(), 'minSteps': self.minSteps() }
+
+    def __str__(self):
+        return ", ".join("%s=%s" % i for i in sorted(self.asDict().items()))
+
+
+def _brake(velocity, rule):
+    # Return the velocity after braking as hard as rule allows, or
+    # None if the car can not slow down at all.  Among the velocities
+    # of the same Euclidean norm, the one with the smallest maximum
+    # norm is taken, so that the car brakes along all axes.
+    v = numpy.array(rule.accelerations(velocity), dtype=numpy.int64)
+    v = v.reshape(-1, 2) + velocity
+    norm2 = (v * v).sum(axis=1)
+    i = numpy.lexsort((numpy.abs(v).max(axis=1), norm2))[0]
+    if not norm2[i] < velocity.x**2 + velocity.y**2:
+        return None
+    return Vector(*v[i].tolist())
+
+
+def brakingPath(velocity, rule=EightNeighboursRule):
+    """Return the positions passed while coming to rest as fast as
+    possible.
+
+    Starting with velocity, the car applies in each move the
+    acceleration allowed by rule that leaves the smallest velocity.
+    Return the list of the positions relative to the starting point
+    after each move, the last one being where the car comes to rest.
+    Return None if rule does not allow to stop.
+
+    >>> brakingPath(Vector(3, 1))
+    [Vector(x=2, y=0), Vector(x=3, y=0), Vector(x=3, y=0)]
+    """
+    path = []
+    pos = NullVector
+    while velocity != NullVector:
+        velocity = _brake(velocity, rule)
+        if velocity is None:
+            return None
+        pos = pos + velocity
+        path.append(pos)
+    return path
+
+
+def distancePolicy(track, temperature=1.0, seed=None):
+    """Return a policy for MultiCarRace.run() guided by the distance
+    field of the track.
+
+    Only moves are considered after which the car is still able to
+    come to rest without a collision, braking as in brakingPath()
+    under the acceleration rule of the race.  Each of them is rated by
+    the distance of its target to the finish, plus a penalty if the
+    car is too fast to stop within that distance.  The moves are
+    chosen at random with a weight of exp(-rating / temperature), so
+    that the policy gets greedier as temperature goes to zero.  A car
+    that can not avoid a crash any more chooses among all moves that
+    do not lead into a barrier right away.
+    """
+    dist = track.getDistanceField().asArray()
+    (nx, ny) = dist.shape
+    # Unreachable points are never a good idea.
+    dist[dist < 0] = nx * ny
+    rnd = numpy.random.RandomState(seed)
+    # The braking paths by rule and velocity.
+    brakes = {}
+
+    def stopping(velocity, rule):
+        # The braking path for the velocity tuple as array of shape
+        # (m, 2), or None if the car can not stop.  The path after the
+        # first braking move is the one of the velocity left, so only
+        # that move is calculated for each velocity.
+        paths = brakes.setdefault(rule, {})
+        chain = []
+        v = velocity
+        while v not in paths:
+            if v == (0, 0):
+                paths[v] = numpy.zeros((0, 2), dtype=numpy.int64)
+                break
+            w = _brake(Vector(*v), rule)
+            chain.append((v, w))
+            if w is None:
+                break
+            v = tuple(w)
+        for (v, w) in reversed(chain):
+            rest = None if w is None else paths[tuple(w)]
+            if rest is None:
+                paths[v] = None
+            else:
+                first = numpy.array([w], dtype=numpy.int64)
+                paths[v] = numpy.vstack((first, rest + first))
+        return paths[velocity]
+
+    def canStop(pos, vel, rule):
+        # True for each car with position pos and velocity vel that
+        # can come to rest without a collision under rule.
+        ok = numpy.ones(len(pos), dtype=bool)
+        (p0, p1, owner) = ([], [], [])
+        (uniq, inverse) = numpy.unique(vel, axis=0, return_inverse=True)
+        # The cars grouped by velocity.
+        inverse = inverse.ravel()
+        order = numpy.argsort(inverse, kind='mergesort')
+        bounds = numpy.zeros(len(uniq) + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(inverse, minlength=len(uniq)),
+                     out=bounds[1:])
+        for (k, v) in enumerate(uniq.tolist()):
+            idx = order[bounds[k]:bounds[k+1]]
+            path = stopping(tuple(v), rule)
+            if path is None:
+                ok[idx] = False
+                continue
+            if len(path) == 0:
+                continue
+            # The moves from pos + path[t-1] to pos + path[t] of all
+            # cars with velocity v.
+            start = numpy.vstack((numpy.zeros((1, 2), dtype=numpy.int64),
+                                  path[:-1]))
+            p0.append((pos[idx, numpy.newaxis, :] + start).reshape(-1, 2))
+            p1.append((pos[idx, numpy.newaxis, :] + path).reshape(-1, 2))
+            owner.append(numpy.repeat(idx, len(path)))
+        if p0:
+            collides = track.checkCollisions(
+                SegmentArray(numpy.concatenate(p0), numpy.concatenate(p1)))
+            owner = numpy.concatenate(owner)
+            ok[owner[collides]] = False
+        return ok
+
+    def policy(race):
+        (accel, mask) = race.candidates()
+        vel = race.vel[:, numpy.newaxis, :] + accel[numpy.newaxis, :, :]
+        p1 = race.pos[:, numpy.newaxis, :] + vel
+        safe = mask.copy()
+        safe[mask] = canStop(p1[mask], vel[mask], race.rule)
+        stuck = ~safe.any(axis=1)
+        safe[stuck] = mask[stuck]
+        d = dist[numpy.clip(p1[..., 0], 0, nx - 1),
+                 numpy.clip(p1[..., 1], 0, ny - 1)]
+        speed = numpy.abs(vel).max(axis=2)
+        decel = max(race.rule.radius(), 1)
+        braking = speed * (speed + decel) // (2 * decel)
+        rating = (d + numpy.maximum(braking - d, 0)).astype(float)
+        rating[~safe] = numpy.inf
+        best = rating.min(axis=1)
+        best[~numpy.isfinite(best)] = 0.0
+        weights = numpy.exp(-(rating - best[:, numpy.newaxis]) /
+                            max(temperature, 1e-6))
+        return chooseCandidates(accel, safe, rnd, weights)
+
+    return policy
+
+
+def rollout(track, pos, velocity=NullVector, n=1000, rule=EightNeighboursRule,
+            policy=None, maxsteps=1000, seed=None):
+    """Play n games from the Point pos with the Vector velocity and
+    return the RolloutStats.
+
+    policy is called with the MultiCarRace playing the games and must
+    return the accelerations of all cars, see MultiCarRace.run().  It
+    defaults to choosing random moves that do not lead into a barrier,
+    seeded with seed.  Each game ends after at most maxsteps moves.
+    This requires NumPy.
+    """
+    race = MultiCarRace(track, n, rule=rule, races=numpy.arange(n),
+                        starts=pos, carCollision='none')
+    race.vel[:] = velocity
+    if pos == track.finish and velocity == NullVector:
+        race.status[:] = race.Finished
+    if policy is None:
+        policy = randomPolicy(seed)
+    race.run(policy, maxsteps)
+    return RolloutStats(race)
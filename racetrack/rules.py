@@ -1,8 +1,103 @@
 """Define rules of the game.
+
+The acceleration rules are compiled into tables of the allowed
+accelerations on first use:
+
+>>> EightNeighboursRule.accelerations()
+(Vector(x=-1, y=-1), Vector(x=-1, y=0), Vector(x=-1, y=1), Vector(x=0, y=-1), Vector(x=0, y=0), Vector(x=0, y=1), Vector(x=1, y=-1), Vector(x=1, y=0), Vector(x=1, y=1))
+>>> len(EuclideanTenRule.accelerations())
+317
+>>> FourNeighboursRule.isAllowed(Vector(1, 1))
+False
+
+Accelerations off the grid are checked against the definition of the
+rule:
+
+>>> EuclideanTenRule.isAllowed(Vector(0.5, 0.5))
+True
+>>> EightNeighboursRule.isAllowed(Vector(1.5, 0))
+False
+
+User defined rules may depend on the velocity of the car.  As an
+example, allow to brake harder than to accelerate:
+
+>>> class BrakeRule(AccelerationRule):
+...     VelocityDependent = True
+...     Radius = 2
+...     @classmethod
+...     def allows(cls, accel, velocity):
+...         limit = 2 if (velocity + accel).norminf() < velocity.norminf() else 1
+...         return accel.norminf() <= limit
+>>> BrakeRule.isAllowed(Vector(-2, 0), Vector(5, 0))
+True
+>>> BrakeRule.isAllowed(Vector(2, 0), Vector(5, 0))
+False
+>>> len(BrakeRule.accelerations(NullVector))
+9
 """
 
 
+from math import floor
 from racetrack.linalg import *
+from racetrack.linalg import numpy
+
+
+class AccelerationTable(object):
+    """The allowed accelerations, compiled from an AccelerationRule.
+
+    The accelerations are held in the tuple accelerations, ordered by
+    x and y.  Membership is tested in constant time with a bitmap
+    covering all vectors with coordinates up to radius in magnitude.
+    """
+
+    __slots__ = ('radius', 'accelerations', '_size', '_bitmap', '_mask')
+
+    def __init__(self, radius, allowed):
+        self.radius = radius
+        self._size = 2*radius + 1
+        bitmap = [False] * (self._size * self._size)
+        accelerations = []
+        for x in range(-radius, radius+1):
+            for y in range(-radius, radius+1):
+                a = smallVector(x, y)
+                if allowed(a):
+                    accelerations.append(a)
+                    bitmap[(x + radius)*self._size + y + radius] = True
+        self.accelerations = tuple(accelerations)
+        self._bitmap = bitmap
+        self._mask = None
+
+    def __len__(self):
+        return len(self.accelerations)
+
+    def __iter__(self):
+        return iter(self.accelerations)
+
+    def __contains__(self, accel):
+        r = self.radius
+        (x, y) = accel
+        x += r
+        y += r
+        if 0 <= x < self._size and 0 <= y < self._size:
+            try:
+                return self._bitmap[x*self._size + y]
+            except TypeError:
+                # Coordinates not of an integer type, e.g. float.
+                if x != int(x) or y != int(y):
+                    return False
+                return self._bitmap[int(x)*self._size + int(y)]
+        return False
+
+    def mask(self):
+        """Return the bitmap as NumPy boolean array.
+
+        The element [x + radius, y + radius] is True if the
+        acceleration (x, y) is allowed.
+        """
+        if self._mask is None:
+            mask = numpy.array(self._bitmap, dtype=bool)
+            self._mask = mask.reshape(self._size, self._size)
+        return self._mask
 
 
 class AccelerationRule(object):
@@ -13,17 +108,132 @@ class AccelerationRule(object):
     and must define the class variables Norm and AccelMax.  Note that
     (child classes of) AccelerationRule only defines a class method
     and does not need to get instatiated.
+
+    The rule is defined by the class method allows(accel, velocity).
+    User defined rules may override it.  If the result depends on the
+    velocity, the class variable VelocityDependent must be set to
+    True.  Radius is the maximum magnitude of the coordinates of any
+    allowed acceleration.  It defaults to the largest integer not
+    exceeding AccelMax, which is correct for any norm that is not
+    smaller than the maximum norm.  Rules that override allows() must
+    set Radius.
+
+    The rule is compiled into AccelerationTables on first use, one
+    table for velocity independent rules, one table for each velocity
+    otherwise.  Call compile() if the class variables are changed
+    afterwards.
     """
 
     Norm = None
     AccelMax = None
+    Radius = None
+    VelocityDependent = False
+
+    # The compiled tables of all rules, keyed by the rule.
+    _tables = {}
 
     @classmethod
-    def isAllowed(cls, accel):
+    def allows(cls, accel, velocity):
+        """True if accel is allowed at velocity according to the rule.
+
+        This is the definition of the rule.  It may be slow, use
+        isAllowed() instead.
+        """
         if cls.Norm is None or cls.AccelMax is None:
-            raise NotImplemented
+            raise NotImplementedError
         return cls.Norm(accel) <= cls.AccelMax
 
+    @classmethod
+    def radius(cls):
+        """Return the maximum magnitude of the coordinates of any allowed
+        acceleration.
+        """
+        if cls.Radius is not None:
+            return cls.Radius
+        if cls.AccelMax is None:
+            raise NotImplementedError
+        return int(floor(cls.AccelMax))
+
+    @classmethod
+    def compile(cls):
+        """Discard the compiled tables, they are rebuilt on next use.
+        """
+        cls._tables[cls] = {}
+
+    @classmethod
+    def table(cls, velocity=NullVector):
+        """Return the AccelerationTable for velocity.
+        """
+        try:
+            tables = cls._tables[cls]
+        except KeyError:
+            tables = cls._tables[cls] = {}
+        key = velocity if cls.VelocityDependent else None
+        try:
+            return tables[key]
+        except KeyError:
+            allowed = lambda a: cls.allows(a, velocity)
+            t = tables[key] = AccelerationTable(cls.radius(), allowed)
+            return t
+
+    @classmethod
+    def accelerations(cls, velocity=NullVector):
+        """Return the tuple of the accelerations allowed at velocity.
+        """
+        return cls.table(velocity).accelerations
+
+    @classmethod
+    def allAccelerations(cls):
+        """Return the accelerations that may be allowed at any velocity.
+
+        For velocity dependent rules, this is all vectors within
+        Radius, a superset of the accelerations allowed at any
+        particular velocity.
+        """
+        if cls.VelocityDependent:
+            r = cls.radius()
+            return tuple(smallVector(x, y) for x in range(-r, r+1)
+                         for y in range(-r, r+1))
+        return cls.accelerations()
+
+    @classmethod
+    def isAllowed(cls, accel, velocity=NullVector):
+        """True if accel is allowed at velocity according to the rule.
+
+        The compiled table is used for accelerations on the grid,
+        allows() for any others.
+        """
+        if accel in cls.table(velocity):
+            return True
+        (x, y) = accel
+        if x == int(x) and y == int(y):
+            return False
+        return cls.allows(accel, velocity)
+
+    @classmethod
+    def areAllowed(cls, accels, velocities):
+        """Vectorized version of isAllowed().
+
+        accels and velocities are integer NumPy arrays of shape (n, 2).
+        Return a boolean array of length n.  This requires NumPy.
+        """
+        accels = numpy.asarray(accels)
+        velocities = numpy.asarray(velocities)
+        if (cls.VelocityDependent or
+            not numpy.issubdtype(accels.dtype, numpy.integer)):
+            return numpy.array([ cls.isAllowed(Vector(*a), Vector(*v))
+                                 for (a, v) in zip(accels.tolist(),
+                                                   velocities.tolist()) ],
+                               dtype=bool).reshape(len(accels))
+        table = cls.table()
+        r = table.radius
+        mask = table.mask()
+        idx = accels + r
+        inside = ((idx >= 0) & (idx <= 2*r)).all(axis=1)
+        result = numpy.zeros(len(accels), dtype=bool)
+        result[inside] = mask[idx[inside,0], idx[inside,1]]
+        return result
+
 
 class EightNeighboursRule(AccelerationRule):
     """Eight neighbours rule: 
@@ -0,0 +1,110 @@
+"""Run a search in a background thread.
+
+A search on a large track may take a long time.  SearchRunner runs a
+ConstraintBacktrack in a worker thread and posts improved solutions
+and progress reports to a queue, which may be polled by a user
+interface, see TrackView.pollRunner().  The search can be paused,
+resumed and cancelled at any time without blocking.
+"""
+
+
+import threading
+import time
+try:
+    import queue
+except ImportError:
+    # Python 2.x
+    import Queue as queue
+from racetrack.exception import NoSolutionError
+
+
+class SearchRunner(object):
+    """Run a ConstraintBacktrack in a worker thread.
+
+    The following messages, each a tuple (kind, data), are posted to
+    the queue:
+
+    ('progress', steps)
+        Total number of search steps performed so far.  Posted at
+        most every progressInterval seconds.
+    ('solution', path)
+        A new and better solution has been found, path is a list of
+        Points.
+    ('done', solution)
+        The search space is exhausted, solution is the best solution
+        or None.
+    ('cancelled', solution)
+        The search has been cancelled.
+    ('error', exception)
+        The search raised an exception.
+    """
+
+    # Number of search steps between two checks of the pause and
+    # cancel flags.
+    BatchSteps = 100
+
+    def __init__(self, backtrack, progressInterval=0.5):
+        self.backtrack = backtrack
+        self.progressInterval = progressInterval
+        self.queue = queue.Queue()
+        self.steps = 0
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self._cancelled = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the search in a new daemon thread.
+        """
+        if self.isRunning():
+            raise RuntimeError("The search is already running.")
+        self._cancelled.clear()
+        self._resumed.set()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def isRunning(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def isPaused(self):
+        return not self._resumed.is_set()
+
+    def pause(self):
+        self._resumed.clear()
+
+    def resume(self):
+        self._resumed.set()
+
+    def cancel(self):
+        """Ask the search to stop.  This does not wait for the worker
+        thread to actually terminate.
+        """
+        self._cancelled.set()
+        self._resumed.set()
+
+    def _run(self):
+        backtrack = self.backtrack
+        car = backtrack.car
+        post = self.queue.put
+        nextProgress = time.time() + self.progressInterval
+        try:
+            while True:
+                self._resumed.wait()
+                if self._cancelled.is_set():
+                    post( ('cancelled', backtrack.solution) )
+                    return
+                for i in range(self.BatchSteps):
+                    backtrack.searchstep()
+                    if car.finished():
+                        backtrack.recordSolution()
+                        post( ('solution', list(backtrack.solution)) )
+                self.steps += self.BatchSteps
+                now = time.time()
+                if now >= nextProgress:
+                    post( ('progress', self.steps) )
+                    nextProgress = now + self.progressInterval
+        except NoSolutionError:
+            post( ('done', backtrack.solution) )
+        except Exception as e:
+            post( ('error', e) )
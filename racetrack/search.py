@@ -0,0 +1,267 @@
+"""Search optimal solutions in the state space of the car.
+
+The state of the car is its position and its velocity.  A move takes
+the car from one state to a successor state, the solutions are paths
+from the current state of the car to the finish, where the car must
+come to rest.
+
+>>> from racetrack.track import Track
+>>> from racetrack.car import Car
+>>> track = Track(10, 5, Point(1, 1), Point(9, 1),
+...               [LineSegment(Point(5, 0), Point(5, 3))])
+>>> car = Car(track)
+>>> AStarSearch(car).search()
+>>> len(car.path) - 1
+8
+>>> car.finished()
+True
+>>> car = Car(track)
+>>> BidirectionalSearch(car).search()
+>>> len(car.path) - 1
+8
+"""
+
+
+import heapq
+from racetrack.linalg import *
+from racetrack.exception import NoSolutionError
+
+
+class KinematicHeuristic(object):
+    """A lower bound for the number of steps to the finish.
+
+    The bound is derived from the kinematics of the car alone,
+    ignoring all barriers: each coordinate is considered
+    independently, assuming that the car may accelerate by up to amax
+    in that coordinate in each step, where amax is the largest
+    coordinate of any allowed acceleration.  The bound is the minimum
+    number of steps needed to cover the remaining distance and to come
+    to rest in the coordinate that needs more steps.  It is admissible
+    and consistent.
+    """
+
+    def __init__(self, accelerations):
+        self.amax = max(max(abs(a.x), abs(a.y)) for a in accelerations)
+        self._dmax = {}
+        self._steps = {}
+
+    def maxDistance(self, n, v):
+        """Maximum distance that can be covered in n steps in one
+        coordinate, starting with velocity v and ending at rest.
+        """
+        try:
+            return self._dmax[n, v]
+        except KeyError:
+            a = self.amax
+            d = 0
+            for k in range(1, n+1):
+                d += min(v + a*k, a*(n-k))
+            self._dmax[n, v] = d
+            return d
+
+    def steps1d(self, d, v):
+        """Minimum number of steps to cover the distance d in one
+        coordinate, starting with velocity v and ending at rest.
+        """
+        try:
+            return self._steps[d, v]
+        except KeyError:
+            a = self.amax
+            # We need at least that many steps to come to rest.
+            n = -(-abs(v) // a)
+            while not (-self.maxDistance(n, -v) <= d <=
+                       self.maxDistance(n, v)):
+                n += 1
+            self._steps[d, v] = n
+            return n
+
+    def pathSteps(self, length, speed):
+        """Minimum number of steps to cover a path of the given length,
+        starting with speed and ending at rest.
+
+        Both length and speed are measured in the maximum norm.  In
+        contrast to steps1d(), the direction may change along the
+        path.
+        """
+        a = self.amax
+        n = -(-speed // a)
+        while self.maxDistance(n, speed) < length:
+            n += 1
+        return n
+
+    def __call__(self, pos, velocity, finish):
+        return max(self.steps1d(finish.x - pos.x, velocity.x),
+                   self.steps1d(finish.y - pos.y, velocity.y))
+
+
+class StateSearch(object):
+    """Common base for searches in the state space of a car.
+    """
+
+    def __init__(self, car):
+        self.car = car
+        self.track = car.track
+        self.finish = car.track.finish
+        self.rule = car.accelerationRule
+        self.solution = None
+        self.expanded = 0
+
+    def successors(self, pos, velocity):
+        """Yield all states that may be reached from (pos, velocity)
+        in one legal move.
+        """
+        findCollision = self.track.findCollision
+        for a in self.rule.accelerations(velocity):
+            v = velocity + a
+            newpos = pos + v
+            if findCollision(LineSegment(pos, newpos)) is None:
+                yield (newpos, v)
+
+    def predecessors(self, pos, velocity):
+        """Yield all states from which (pos, velocity) may be reached
+        in one legal move.
+        """
+        prev = pos - velocity
+        if self.track.findCollision(LineSegment(prev, pos)) is None:
+            rule = self.rule
+            if rule.VelocityDependent:
+                for a in rule.allAccelerations():
+                    if rule.isAllowed(a, velocity - a):
+                        yield (prev, velocity - a)
+            else:
+                for a in rule.accelerations():
+                    yield (prev, velocity - a)
+
+    def _moveCar(self, positions):
+        # Move the car along the positions and record the solution.
+        for p in positions:
+            self.car.move(p)
+        self.solution = list(self.car.path)
+
+
+class AStarSearch(StateSearch):
+    """Search an optimal solution with the A* algorithm.
+
+    The search runs over the states (pos, velocity) of the car,
+    starting from its current state.  It uses a KinematicHeuristic
+    and keeps a closed set of the states already expanded.  The path
+    found is provably optimal, i.e. it has the minimal number of steps
+    of all solutions extending the current path of the car.
+    """
+
+    def __init__(self, car):
+        super(AStarSearch, self).__init__(car)
+        self.heuristic = KinematicHeuristic(self.rule.allAccelerations())
+
+    def search(self):
+        """Search an optimal solution and move the car along it.
+
+        Raise NoSolutionError if the finish can not be reached.
+        """
+        h = self.heuristic
+        finish = self.finish
+        goal = (finish, NullVector)
+        start = (self.car.pos, self.car.velocity)
+        # The entries in the open list are (f, -g, count, state).
+        # Among the entries with equal f, the deepest one is
+        # preferred, count breaks the remaining ties in FIFO order.
+        count = 0
+        openlist = [ (h(start[0], start[1], finish), 0, count, start) ]
+        gscore = { start: 0 }
+        parent = { start: None }
+        closed = set()
+        while openlist:
+            (f, g, c, state) = heapq.heappop(openlist)
+            if state in closed:
+                continue
+            if state == goal:
+                break
+            closed.add(state)
+            self.expanded += 1
+            g = -g + 1
+            for s in self.successors(*state):
+                if s in closed or gscore.get(s, g+1) <= g:
+                    continue
+                gscore[s] = g
+                parent[s] = state
+                count += 1
+                heapq.heappush(openlist,
+                               (g + h(s[0], s[1], finish), -g, count, s))
+        else:
+            raise NoSolutionError()
+
+        moves = []
+        while parent[state] is not None:
+            moves.append(state[0])
+            state = parent[state]
+        moves.reverse()
+        self._moveCar(moves)
+
+
+class BidirectionalSearch(StateSearch):
+    """Search an optimal solution with a bidirectional breadth first
+    search.
+
+    A forward search from the current state of the car and a backward
+    search from the goal state, i.e. the finish with zero velocity,
+    are run alternately, one layer at a time, always expanding the
+    smaller frontier.  The search ends after the first layer in which
+    both searches meet, the solution is optimal.
+    """
+
+    def search(self):
+        """Search an optimal solution and move the car along it.
+
+        Raise NoSolutionError if the finish can not be reached.
+        """
+        start = (self.car.pos, self.car.velocity)
+        goal = (self.finish, NullVector)
+        # parent maps the states reached by the forward search to
+        # their predecessor, child maps the states reached by the
+        # backward search to their successor.
+        parent = { start: None }
+        child = { goal: None }
+        fdist = { start: 0 }
+        bdist = { goal: 0 }
+        ffrontier = [ start ]
+        bfrontier = [ goal ]
+        meet = start if start == goal else None
+        while meet is None:
+            if not ffrontier or not bfrontier:
+                raise NoSolutionError()
+            best = None
+            if len(ffrontier) <= len(bfrontier):
+                (frontier, expand) = (ffrontier, self.successors)
+                (links, dist, odist) = (parent, fdist, bdist)
+            else:
+                (frontier, expand) = (bfrontier, self.predecessors)
+                (links, dist, odist) = (child, bdist, fdist)
+            newfrontier = []
+            for state in frontier:
+                self.expanded += 1
+                d = dist[state] + 1
+                for s in expand(*state):
+                    if s not in dist:
+                        dist[s] = d
+                        links[s] = state
+                        newfrontier.append(s)
+                    if s in odist:
+                        c = dist[s] + odist[s]
+                        if best is None or c < best:
+                            (best, meet) = (c, s)
+            if frontier is ffrontier:
+                ffrontier = newfrontier
+            else:
+                bfrontier = newfrontier
+
+        moves = []
+        state = meet
+        while parent[state] is not None:
+            moves.append(state[0])
+            state = parent[state]
+        moves.reverse()
+        state = child[meet]
+        while state is not None:
+            moves.append(state[0])
+            state = child[state]
+        self._moveCar(moves)
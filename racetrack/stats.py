@@ -0,0 +1,177 @@
+"""Instrumentation of searches.
+
+A SearchStats object collects counters and optionally timings while
+a search is running.  It is attached to a backtrack strategy with
+setStats(), which also attaches it to the car and the track:
+
+>>> from racetrack.linalg import Point, LineSegment
+>>> from racetrack.track import Track
+>>> from racetrack.car import Car
+>>> from racetrack.backtrack import ConstraintBacktrack
+>>> track = Track(10, 5, Point(1, 1), Point(9, 1),
+...               [LineSegment(Point(5, 0), Point(5, 3))])
+>>> backtrack = ConstraintBacktrack(Car(track), maxsteps=9,
+...                                 distfield=track.getDistanceField())
+>>> stats = SearchStats(timers=True)
+>>> backtrack.setStats(stats)
+>>> backtrack.search()
+>>> stats.solutions
+2
+>>> stats.movesTried == stats.expanded - 1 + stats.collisions
+True
+>>> stats.collisionChecks == stats.movesTried
+True
+
+If no SearchStats is attached, the instrumentation costs next to
+nothing: the track, the car and the backtrack strategies only check
+whether their stats attribute is None.
+"""
+
+
+import time
+from array import array
+from racetrack.linalg import numpy
+
+
+try:
+    clock = time.perf_counter
+except AttributeError:
+    # Python 2.x
+    clock = time.time
+
+
+class SearchStats(object):
+    """Counters and timers of a search.
+
+    The counters are:
+
+    expanded
+        Number of positions expanded, i.e. from which the candidate
+        moves have been generated.
+    movesTried
+        Number of moves tried with Car.tryMove().
+    collisions
+        Number of moves rejected due to a collision.
+    accelRejected
+        Number of moves rejected because the acceleration is not
+        allowed.
+    collisionChecks
+        Number of calls of Track.findCollision().
+    stackHighWater
+        Maximum size of the search stack.
+    solutions
+        Number of solutions found.
+
+    If timers is True, the time spent expanding positions and in
+    collision checks is accumulated in expandTime and collisionTime
+    respectively, in seconds.  Note that the collision checks done
+    while expanding are included in both.
+
+    If callback is set, it is called with the SearchStats object as
+    argument at most every interval seconds while the search is
+    running.
+
+    If the visits attribute is set to a VisitCounts object, the
+    position of each expanded state is counted in it.
+    """
+
+    Counters = ('expanded', 'movesTried', 'collisions', 'accelRejected',
+                'collisionChecks', 'stackHighWater', 'solutions')
+    Timers = ('expandTime', 'collisionTime')
+
+    def __init__(self, timers=False, callback=None, interval=1.0):
+        self.timers = timers
+        self.callback = callback
+        self.interval = interval
+        self.visits = None
+        self.reset()
+
+    def reset(self):
+        """Set all counters and timers to zero.
+        """
+        for c in self.Counters:
+            setattr(self, c, 0)
+        for t in self.Timers:
+            setattr(self, t, 0.0)
+        self._lastCallback = clock()
+
+    def stack(self, size):
+        """Record the current size of the search stack.
+        """
+        if size > self.stackHighWater:
+            self.stackHighWater = size
+
+    def tick(self):
+        """Call the callback if the interval has elapsed.
+        """
+        if self.callback is not None:
+            now = clock()
+            if now - self._lastCallback >= self.interval:
+                self._lastCallback = now
+                self.callback(self)
+
+    def asDict(self):
+        """Return the counters and, if enabled, the timers as dict.
+        """
+        d = dict( (c, getattr(self, c)) for c in self.Counters )
+        if self.timers:
+            d.update( (t, getattr(self, t)) for t in self.Timers )
+        return d
+
+    def __str__(self):
+        return ", ".join("%s=%s" % i for i in sorted(self.asDict().items()))
+
+
+class VisitCounts(object):
+    """Count how often each grid point of a track has been visited.
+
+    The counts are kept in the NumPy array counts, indexed by [x, y]
+    for 0 <= x <= width+1 and 0 <= y <= height+1.  The points added
+    are buffered and only added to counts in chunks of FlushSize,
+    which keeps add() cheap.  So the counts may lag behind by up to
+    FlushSize visits, call flush() to catch up.  total is the number
+    of visits in counts.
+
+    add() and flush() may be called from the thread running the
+    search, while another thread reads counts.
+
+    >>> from racetrack.linalg import Point
+    >>> from racetrack.track import Track
+    >>> visits = VisitCounts(Track(10, 5, Point(1, 1), Point(9, 1)))
+    >>> for p in [Point(1, 1), Point(2, 1), Point(1, 1)]:
+    ...     visits.add(p)
+    >>> visits.flush()
+    >>> visits.total
+    3
+    >>> visits.counts[1:3, 1].tolist()
+    [2, 1]
+    """
+
+    FlushSize = 4096
+
+    def __init__(self, track):
+        if numpy is None:
+            raise ImportError("VisitCounts requires NumPy.")
+        self.stride = track.height + 2
+        self.counts = numpy.zeros((track.width + 2, self.stride),
+                                  dtype=numpy.int64)
+        self.total = 0
+        self._buffer = array('l')
+
+    def add(self, p):
+        """Count a visit of the Point p, which must lie on the track.
+        """
+        buf = self._buffer
+        buf.append(p.x * self.stride + p.y)
+        if len(buf) >= self.FlushSize:
+            self.flush()
+
+    def flush(self):
+        """Add all buffered visits to counts.
+        """
+        buf = self._buffer
+        if buf:
+            self._buffer = array('l')
+            idx = numpy.frombuffer(buf, dtype='l')
+            numpy.add.at(self.counts.reshape(-1), idx, 1)
+            self.total += len(buf)
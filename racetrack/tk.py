@@ -1,7 +1,56 @@
 """Graphical user interface elements for Racetrack using the Tk interface.
 """
 
+from math import floor
+import struct
+import zlib
+import base64
 import Tkinter as tk
+try:
+    import queue
+except ImportError:
+    # Python 2.x
+    import Queue as queue
+from racetrack.linalg import numpy
+from racetrack.stats import clock
+
+
+def _pngChunk(kind, data):
+    crc = zlib.crc32(kind + data) & 0xffffffff
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', crc)
+
+def pngData(rgba):
+    """Encode an image as PNG for a Tk PhotoImage.
+
+    rgba is a NumPy uint8 array of shape (height, width, 4).  Return
+    the base64 encoded PNG data.
+    """
+    (h, w) = rgba.shape[:2]
+    raw = numpy.zeros((h, 1 + 4*w), dtype=numpy.uint8)
+    raw[:,1:] = rgba.reshape(h, 4*w)
+    header = struct.pack('>IIBBBBB', w, h, 8, 6, 0, 0, 0)
+    png = (b'\x89PNG\r\n\x1a\n' + _pngChunk(b'IHDR', header) +
+           _pngChunk(b'IDAT', zlib.compress(raw.tobytes(), 1)) +
+           _pngChunk(b'IEND', b''))
+    return base64.b64encode(png)
+
+def heatmapColors(counts):
+    """Map visit counts to colors.
+
+    Return a uint8 array of the shape of counts plus a trailing
+    dimension of size 4 with RGBA colors.  Unvisited points are
+    transparent, the others range from a translucent yellow for a
+    single visit to an opaque red for the maximum count on a
+    logarithmic scale.
+    """
+    rgba = numpy.zeros(counts.shape + (4,), dtype=numpy.uint8)
+    cmax = counts.max() if counts.size else 0
+    if cmax > 0:
+        t = numpy.log1p(counts) / numpy.log1p(cmax)
+        rgba[...,0] = 255
+        rgba[...,1] = (255 * (1 - t)).astype(numpy.uint8)
+        rgba[...,3] = numpy.where(counts > 0, 96 + 159 * t, 0)
+    return rgba
 
 
 class ZoomingCanvas(tk.Canvas):
@@ -11,6 +60,12 @@ class ZoomingCanvas(tk.Canvas):
     the zooming.  It supports an independent static coordinate system
     and translation of this static coordinates into canvas
     coordinates.
+
+    Items tagged 'viewport' depend on the visible part of the canvas.
+    They are neither scaled on zoom nor considered for the scroll
+    region.  Instead, updateViewport() is called whenever the visible
+    part changes due to zooming, scrolling or resizing, so that
+    derived classes may redraw them.
     """
 
     def __init__(self, parent, xsc, ysc, **kwargs):
@@ -29,12 +84,63 @@ class ZoomingCanvas(tk.Canvas):
         self._cy0 = 0
         self._cxsc = xsc
         self._cysc = ysc
+        self._viewportPending = False
         # Bindings.
         self.bind("<Button-4>", self.zoomIn)
         self.bind("<Button-5>", self.zoomOut)
+        self.bind("<Configure>", self._viewChanged)
+
+    def _viewChanged(self, event=None):
+        # Schedule updateViewport() once, when Tk is idle, however
+        # often the view changes in the meantime.
+        if not self._viewportPending:
+            self._viewportPending = True
+            self.after_idle(self._updateViewport)
+
+    def _updateViewport(self):
+        self._viewportPending = False
+        self.updateViewport()
+
+    def updateViewport(self):
+        """Redraw the items tagged 'viewport'.
+
+        Called when the visible part of the canvas has changed.  This
+        does nothing, derived classes may override it.
+        """
+        pass
+
+    def visibleArea(self):
+        """Return the visible part of the canvas as tuple (x0, y0, x1,
+        y1) in static coordinates, with x0 <= x1 and y0 <= y1.
+        """
+        w = self.winfo_width()
+        h = self.winfo_height()
+        if w <= 1 or h <= 1:
+            # The widget is not yet mapped.
+            w = float(self.cget('width'))
+            h = float(self.cget('height'))
+        (cx0, cy0) = (self.canvasx(0), self.canvasy(0))
+        (cx1, cy1) = (self.canvasx(w), self.canvasy(h))
+        (x0, x1) = sorted(((cx0 - self._cx0) / self._cxsc,
+                           (cx1 - self._cx0) / self._cxsc))
+        (y0, y1) = sorted(((cy0 - self._cy0) / self._cysc,
+                           (cy1 - self._cy0) / self._cysc))
+        return (x0, y0, x1, y1)
+
+    def xview(self, *args):
+        result = tk.Canvas.xview(self, *args)
+        if args:
+            self._viewChanged()
+        return result
+
+    def yview(self, *args):
+        result = tk.Canvas.yview(self, *args)
+        if args:
+            self._viewChanged()
+        return result
 
     def _getPaddedBB(self):
-        bb = list(self.bbox('all'))
+        bb = list(self.bbox('!viewport'))
         bb[0] -= self._screg_padx0
         bb[1] -= self._screg_pady0
         bb[2] += self._screg_padx1
@@ -76,9 +182,10 @@ class ZoomingCanvas(tk.Canvas):
             cx = ((xv0 + xv1) * scx1 + (2 - xv1 - xv0) * scx0) / 2.0
         if cy is None:
             cy = ((yv0 + yv1) * scy1 + (2 - yv1 - yv0) * scy0) / 2.0
-        self.scale('all', cx, cy, scale, scale)
+        self.scale('!viewport', cx, cy, scale, scale)
         self._updateScrollregion()
         self._updateTranslation()
+        self._viewChanged()
 
     def zoomIn(self, event=None):
         if event:
@@ -95,26 +202,34 @@ class ZoomingCanvas(tk.Canvas):
 
 class TrackView(ZoomingCanvas):
     """A visualization widget for the race track.
+
+    The background grid is only drawn for the visible part of the
+    track.  If the grid lines would be closer than MinGridSpacing
+    pixels, only every second, fifth, tenth, ... line is drawn.
+
+    A heatmap of the positions visited by a search may be overlaid,
+    see showHeatmap().  It is rendered as one single image of the
+    visible area, so the cost of drawing it does not depend on the
+    number of states visited.
     """
 
+    MinGridSpacing = 8
+    # The minimum time in seconds between two redraws of the heatmap
+    # by refreshHeatmap().
+    HeatmapMinInterval = 1.0
+
     def __init__(self, parent, track, **kwargs):
         kwargs.setdefault('width', 1500)
         kwargs.setdefault('height', 1100)
         ZoomingCanvas.__init__(self, parent, 10, -10, 
                                background='white', **kwargs)
 
-        # Draw the background grid.
-        (xmin, ymin, xmax, ymax) = track.bbox()
-        for x in range(xmin, xmax+1):
-            cx = self.stat2canx(x)
-            cy0 = self.stat2cany(ymin)
-            cy1 = self.stat2cany(ymax)
-            self.create_line(cx, cy0, cx, cy1, fill='#ddd', tags='grid')
-        for y in range(ymin, ymax+1):
-            cx0 = self.stat2canx(xmin)
-            cx1 = self.stat2canx(xmax)
-            cy = self.stat2cany(y)
-            self.create_line(cx0, cy, cx1, cy, fill='#ddd', tags='grid')
+        # The background grid is drawn by updateViewport().
+        self.gridbbox = track.bbox()
+        self._heatmap = None
+        self._heatmapTotal = None
+        self._heatmapImage = None
+        self._heatmapTime = None
 
         # Draw the barriers.  This also includes the outer boundary.
         for l in track.barriers:
@@ -136,6 +251,115 @@ class TrackView(ZoomingCanvas):
         # Rescale the widget such that it fits in the configured window.
         self.zoom()
 
+    def gridStep(self):
+        """Return the distance of the grid lines to draw at the current
+        zoom level in static coordinates.
+        """
+        spacing = min(abs(self._cxsc), abs(self._cysc))
+        step = 1
+        while step * spacing < self.MinGridSpacing:
+            for f in (2, 5, 10):
+                if step * f * spacing >= self.MinGridSpacing:
+                    return step * f
+            step *= 10
+        return step
+
+    def updateViewport(self):
+        """Redraw the background grid for the visible area.
+        """
+        self.delete('grid')
+        (xmin, ymin, xmax, ymax) = self.gridbbox
+        (x0, y0, x1, y1) = self.visibleArea()
+        step = self.gridStep()
+        x0 = max(xmin, int(floor(x0 / step)) * step)
+        x1 = min(xmax, int(floor(x1)) + 1)
+        y0 = max(ymin, int(floor(y0 / step)) * step)
+        y1 = min(ymax, int(floor(y1)) + 1)
+        if x0 > x1 or y0 > y1:
+            return
+        cy0 = self.stat2cany(y0)
+        cy1 = self.stat2cany(y1)
+        for x in range(x0, x1+1, step):
+            cx = self.stat2canx(x)
+            self.create_line(cx, cy0, cx, cy1, fill='#ddd',
+                             tags=('grid', 'viewport'))
+        cx0 = self.stat2canx(x0)
+        cx1 = self.stat2canx(x1)
+        for y in range(y0, y1+1, step):
+            cy = self.stat2cany(y)
+            self.create_line(cx0, cy, cx1, cy, fill='#ddd',
+                             tags=('grid', 'viewport'))
+        self.tag_lower('grid')
+        if self._heatmap is not None:
+            self._drawHeatmap()
+
+    def showHeatmap(self, visits):
+        """Overlay a heatmap of the visit counts of a search.
+
+        visits is a racetrack.stats.VisitCounts object, that may still
+        be updated by a running search.  Call refreshHeatmap() to
+        redraw the heatmap with the current counts.  This requires
+        NumPy and Tk 8.6.
+        """
+        self._heatmap = visits
+        self._drawHeatmap()
+
+    def hideHeatmap(self):
+        self._heatmap = None
+        self._heatmapTotal = None
+        self._heatmapImage = None
+        self._heatmapTime = None
+        self.delete('heatmap')
+
+    def refreshHeatmap(self, force=False):
+        """Redraw the heatmap if the counts have changed.
+
+        Each redraw colors all pixels of the visible area and encodes
+        them as PNG image on the Tk main loop, which takes time in the
+        order of the size of the window.  So the heatmap is redrawn at
+        most every HeatmapMinInterval seconds, unless force is True.
+        """
+        if (self._heatmap is None or
+            self._heatmap.total == self._heatmapTotal):
+            return
+        if (force or self._heatmapTime is None or
+            clock() - self._heatmapTime >= self.HeatmapMinInterval):
+            self._drawHeatmap()
+
+    def _drawHeatmap(self):
+        visits = self._heatmap
+        self._heatmapTotal = visits.total
+        self._heatmapTime = clock()
+        counts = visits.counts
+        (nx, ny) = counts.shape
+        # The colors of the grid points, with an extra transparent
+        # point at the end for the pixels outside of the track.
+        colors = numpy.zeros((nx + 1, ny + 1, 4), dtype=numpy.uint8)
+        colors[:nx,:ny] = heatmapColors(counts)
+        # Each grid point is drawn as a square of one grid unit
+        # centered at the point.  Find the grid point for the center
+        # of each pixel of the visible area.
+        w = self.winfo_width()
+        h = self.winfo_height()
+        if w <= 1 or h <= 1:
+            w = int(float(self.cget('width')))
+            h = int(float(self.cget('height')))
+        (cx, cy) = (self.canvasx(0), self.canvasy(0))
+        px = cx + numpy.arange(w) + 0.5
+        py = cy + numpy.arange(h) + 0.5
+        ix = numpy.floor((px - self._cx0) / self._cxsc + 0.5).astype(int)
+        iy = numpy.floor((py - self._cy0) / self._cysc + 0.5).astype(int)
+        ix[(ix < 0) | (ix >= nx)] = nx
+        iy[(iy < 0) | (iy >= ny)] = ny
+        rgba = colors[ix[numpy.newaxis,:], iy[:,numpy.newaxis]]
+        self._heatmapImage = tk.PhotoImage(data=pngData(rgba), format='png')
+        self.delete('heatmap')
+        self.create_image(cx, cy, anchor=tk.NW, image=self._heatmapImage,
+                          tags=('heatmap', 'viewport'))
+        # Keep the heatmap above the grid but below everything else.
+        self.tag_lower('heatmap')
+        self.tag_lower('grid')
+
     def drawPath(self, path, fill='blue', width=3, capstyle=tk.ROUND, tags=[]):
         coords = []
         for p in path:
@@ -144,3 +368,39 @@ class TrackView(ZoomingCanvas):
         self.create_line(coords, fill=fill, width=width, capstyle=capstyle, 
                          tags=tags)
 
+    def pollRunner(self, runner, callback, interval=200):
+        """Poll the queue of a SearchRunner from the Tk main loop.
+
+        Every interval milliseconds, fetch all pending messages from
+        the queue of the runner and call callback(kind, data) for
+        them.  Of several pending progress or solution messages, only
+        the latest one is passed on.  Polling stops after a
+        message that terminates the search.
+        """
+        final = ('done', 'cancelled', 'error')
+        def poll():
+            latest = {}
+            messages = []
+            while True:
+                try:
+                    (kind, data) = runner.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if kind in ('progress', 'solution'):
+                    if kind not in latest:
+                        messages.append(kind)
+                    latest[kind] = data
+                else:
+                    messages.append( (kind, data) )
+            stop = False
+            for m in messages:
+                if isinstance(m, tuple):
+                    (kind, data) = m
+                else:
+                    (kind, data) = (m, latest[m])
+                callback(kind, data)
+                if kind in final:
+                    stop = True
+            if not stop:
+                self.after(interval, poll)
+        self.after(interval, poll)
@@ -1,16 +1,265 @@
 """Provide the track.
 
 This module defines the track, that is the playground for the game.  
+
+The collision checks with the rasterized OccupancyGrid give exactly
+the same results as the exact geometry of the barriers:
+
+>>> import random
+>>> rnd = random.Random(42)
+>>> def randomSegment(maxlen):
+...     p = Point(rnd.randint(-1, 42), rnd.randint(-1, 32))
+...     v = Vector(rnd.randint(-maxlen, maxlen), rnd.randint(-maxlen, maxlen))
+...     return LineSegment(p, p + v)
+>>> barriers = [ randomSegment(12) for i in range(40) ]
+>>> exact = Track(40, 30, Point(1, 1), Point(40, 30), barriers)
+>>> raster = Track(40, 30, Point(1, 1), Point(40, 30), barriers[:20])
+>>> raster.enableRaster(8)
+>>> raster.addBarriers(barriers[20:])
+>>> moves = [ randomSegment(9) for i in range(20000) ]
+>>> all(raster.findCollision(m) == exact.findCollision(m) for m in moves)
+True
+>>> sum(exact.findCollision(m) is None for m in moves) > 2000
+True
+
+A track with a raster can be pickled as well:
+
+>>> import pickle
+>>> copy = pickle.loads(pickle.dumps(raster))
+>>> all(copy.findCollision(m) == exact.findCollision(m) for m in moves)
+True
 """
 
 
 from numbers import Integral
+from math import floor
+from fractions import Fraction
+from array import array
+from collections import deque
 from racetrack.linalg import *
+from racetrack.linalg import numpy
 from racetrack.exception import CollisionError
+from racetrack.stats import clock
+
+
+class BarrierGrid(object):
+    """A spatial index of barriers based on uniform grid buckets.
+
+    The plane is divided into square cells of size cellsize.  Each
+    barrier is registered in all cells that are overlapped by its
+    bounding box.  The index allows to quickly select those barriers
+    whose bounding boxes overlap a given rectangle.  Barriers are
+    identified by an integer key, typically their index in the list
+    of barriers of the track.
+    """
+
+    def __init__(self, cellsize=16):
+        if not cellsize > 0:
+            raise ValueError("cellsize must be larger then zero.")
+        self.cellsize = cellsize
+        self.cells = {}
+        self.bboxes = {}
+
+    def _cellrange(self, x0, y0, x1, y1):
+        cs = self.cellsize
+        return (int(floor(x0 / cs)), int(floor(y0 / cs)),
+                int(floor(x1 / cs)), int(floor(y1 / cs)))
+
+    def add(self, key, segment):
+        """Register a LineSegment with the index.
+        """
+        (p0, p1) = (segment.p0, segment.p1)
+        bbox = (min(p0.x, p1.x), min(p0.y, p1.y),
+                max(p0.x, p1.x), max(p0.y, p1.y))
+        self.bboxes[key] = bbox
+        (i0, j0, i1, j1) = self._cellrange(*bbox)
+        for i in range(i0, i1+1):
+            for j in range(j0, j1+1):
+                self.cells.setdefault((i, j), []).append(key)
+
+    def candidates(self, x0, y0, x1, y1):
+        """Return the keys of all barriers whose bounding boxes overlap
+        the rectangle (x0, y0, x1, y1) in ascending order.
+        """
+        (i0, j0, i1, j1) = self._cellrange(x0, y0, x1, y1)
+        cells = self.cells
+        if i0 == i1 and j0 == j1:
+            keys = cells.get((i0, j0), ())
+        else:
+            keys = set()
+            for i in range(i0, i1+1):
+                for j in range(j0, j1+1):
+                    keys.update(cells.get((i, j), ()))
+            keys = sorted(keys)
+        bboxes = self.bboxes
+        result = []
+        for k in keys:
+            (bx0, by0, bx1, by1) = bboxes[k]
+            if bx0 <= x1 and x0 <= bx1 and by0 <= y1 and y0 <= by1:
+                result.append(k)
+        return result
+
+
+def supercover(p0, p1):
+    """Return the grid cells touched by the line segment from p0 to p1.
+
+    The cell (i, j) is the closed unit square [i, i+1] x [j, j+1].
+    The result is the list of all cells that have at least one point
+    in common with the segment.  Both points must be integral.
+    """
+    (x0, y0) = (int(p0.x), int(p0.y))
+    (x1, y1) = (int(p1.x), int(p1.y))
+    if x0 > x1:
+        (x0, y0, x1, y1) = (x1, y1, x0, y0)
+    (ymin, ymax) = (min(y0, y1), max(y0, y1))
+    cells = []
+    for i in range(x0 - 1, x1 + 1):
+        # The range of y on the segment within the column [i, i+1].
+        if x0 == x1:
+            (ylo, yhi) = (ymin, ymax)
+        else:
+            xa = max(i, x0)
+            xb = min(i + 1, x1)
+            ya = y0 + Fraction((xa - x0) * (y1 - y0), x1 - x0)
+            yb = y0 + Fraction((xb - x0) * (y1 - y0), x1 - x0)
+            (ylo, yhi) = (min(ya, yb), max(ya, yb))
+        jlo = int(floor(ylo))
+        if jlo == ylo:
+            jlo -= 1
+        for j in range(jlo, int(floor(yhi)) + 1):
+            cells.append((i, j))
+    return cells
+
+
+class OccupancyGrid(object):
+    """A rasterized collision backend.
+
+    The barriers are rasterized once into a bitmap of the grid cells
+    they touch, see supercover().  For each move vector up to
+    maxspeed in the maximum norm, the stencil of cells touched by the
+    move is precomputed.  If a move and a barrier intersect, the
+    intersection point lies in a cell touched by both.  So only the
+    barriers registered in the occupied cells of the stencil of a move
+    need to be tested exactly, and in most cases there are none.
+
+    Furthermore, the clearance of each point is derived from the
+    bitmap, that is the number of squares of cells centered around
+    the point that are free of barriers.  Moves slower than the
+    clearance of their starting point can not collide at all and
+    need no further check.
+
+    The grid covers the cells (i, j) with 0 <= i <= width and 0 <= j
+    <= height, that is all cells touched by moves within the track
+    area.
+    """
+
+    def __init__(self, width, height, maxspeed):
+        if numpy is None:
+            raise ImportError("OccupancyGrid requires NumPy.")
+        self.nx = width + 1
+        self.ny = height + 1
+        self.maxspeed = maxspeed
+        self.occupied = numpy.zeros(self.nx * self.ny, dtype=bool)
+        # Indexing a memoryview is much faster than indexing the array
+        # for single cells.
+        self._occupied = memoryview(self.occupied)
+        self._clearance = None
+        self.cellBarriers = {}
+        self.stencils = {}
+        origin = Point(0, 0)
+        for dx in range(-maxspeed, maxspeed+1):
+            for dy in range(-maxspeed, maxspeed+1):
+                cells = supercover(origin, Point(dx, dy))
+                offsets = [ i*self.ny + j for (i, j) in cells ]
+                self.stencils[dx, dy] = tuple(offsets)
+
+    def add(self, key, segment):
+        """Rasterize a barrier.
+        """
+        if not segment.isIntegral():
+            raise ValueError("OccupancyGrid requires integral barriers.")
+        for (i, j) in supercover(segment.p0, segment.p1):
+            if 0 <= i < self.nx and 0 <= j < self.ny:
+                c = i*self.ny + j
+                self.occupied[c] = True
+                self.cellBarriers.setdefault(c, []).append(key)
+        self._clearance = None
+
+    def __getstate__(self):
+        # Memoryviews can not be pickled, they are created again from
+        # the arrays.
+        state = self.__dict__.copy()
+        del state['_occupied']
+        if self._clearance is not None:
+            state['_clearance'] = numpy.asarray(self._clearance)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._occupied = memoryview(self.occupied)
+        if self._clearance is not None:
+            self._clearance = memoryview(self._clearance)
+
+    def clearance(self):
+        """Return the clearance of all points as flat array.
+
+        The clearance of the point (x, y) is at index x*(height+1) + y.
+        A move of speed s from that point touches only cells in the
+        square of cells (i, j) with x-s-1 <= i <= x+s and y-s-1 <= j
+        <= y+s.  The clearance is the number of speeds s = 0, 1, ...,
+        maxspeed for which this square is free.
+        """
+        if self._clearance is None:
+            occ = self.occupied.reshape(self.nx, self.ny)
+            # Cells left of or below the grid are considered occupied.
+            occ = numpy.pad(occ, ((1, 0), (1, 0)), 'constant',
+                            constant_values=True)
+            free = ~(occ[:-1,:-1] | occ[1:,:-1] | occ[:-1,1:] | occ[1:,1:])
+            clearance = free.astype(numpy.intc)
+            for s in range(self.maxspeed):
+                f = numpy.pad(free, 1, 'constant', constant_values=False)
+                free = free & f[:-2,1:-1] & f[2:,1:-1] & f[1:-1,:-2] & \
+                    f[1:-1,2:] & f[:-2,:-2] & f[2:,2:] & f[:-2,2:] & f[2:,:-2]
+                clearance += free
+            self._clearance = memoryview(clearance.ravel())
+        return self._clearance
+
+    def candidates(self, move):
+        """Return the keys of the barriers that need to be tested
+        against move in ascending order.
+
+        Return None if the move can not be handled by the raster,
+        because it is not integral or too fast.
+        """
+        (x0, y0) = move.p0
+        (x1, y1) = move.p1
+        (dx, dy) = (x1 - x0, y1 - y0)
+        stencil = self.stencils.get((dx, dy))
+        if stencil is None:
+            return None
+        base = x0*self.ny + y0
+        if type(base) is not int and not isinstance(base, Integral):
+            return None
+        clearance = self._clearance or self.clearance()
+        if max(dx, -dx, dy, -dy) < clearance[base]:
+            return []
+        occupied = self._occupied
+        hits = [ base + c for c in stencil if occupied[base + c] ]
+        if not hits:
+            return hits
+        cellBarriers = self.cellBarriers
+        keys = set()
+        for c in hits:
+            keys.update(cellBarriers[c])
+        return sorted(keys)
 
 
 class Track(object):
 
+    # The number of moves checkCollisions() handles at once.  This
+    # bounds the size of temporary arrays.
+    CollisionBlockSize = 1 << 16
+
     def __init__(self, width, height, start, finish, barriers=[]):
         if not (isinstance(width, Integral) and isinstance(height, Integral)):
             raise TypeError("Track bounds must be integral numbers.")
@@ -24,6 +273,8 @@ class Track(object):
                 0 < finish.x <= width and 0 < finish.y <= height):
             raise ValueError("start and finish must be within Track bounds.")
 
+        self.width = width
+        self.height = height
         self.start = start
         self.finish = finish
 
@@ -31,13 +282,77 @@ class Track(object):
         p1 = Point(x=width+1, y=0)
         p2 = Point(x=width+1, y=height+1)
         p3 = Point(x=0, y=height+1)
-        # Add the borders of the track area as barriers.
+        # Add the borders of the track area as barriers.  They are
+        # not registered in the spatial index, checkCollision() tests
+        # against the track bounds instead.
         self.barriers = [ LineSegment(p0, p1), LineSegment(p1, p2), 
                           LineSegment(p2, p3), LineSegment(p3, p0) ]
+        self._nborders = len(self.barriers)
+        self._index = BarrierGrid()
+        self._raster = None
+        self._barrierArray = None
+        self._barrierCells = None
+        self._distanceField = None
+        self.stats = None
         self.addBarriers(barriers)
 
+    @classmethod
+    def load(cls, fname):
+        """Load a track from a file, see racetrack.trackfile.
+        """
+        import racetrack.trackfile
+        return racetrack.trackfile.load(fname)
+
+    def save(self, fname, index=True):
+        """Save the track to a file, see racetrack.trackfile.
+        """
+        import racetrack.trackfile
+        racetrack.trackfile.save(self, fname, index)
+
     def addBarriers(self, barriers):
-        self.barriers.extend(barriers)
+        for b in barriers:
+            self._index.add(len(self.barriers), b)
+            if self._raster is not None:
+                self._raster.add(len(self.barriers), b)
+            self.barriers.append(b)
+        self._barrierArray = None
+        self._barrierCells = None
+        self._distanceField = None
+
+    def enableRaster(self, maxspeed):
+        """Use an OccupancyGrid for collision checks.
+
+        Moves up to maxspeed in the maximum norm between integral
+        points are then checked with a few lookups in a bitmap.  The
+        results are exactly the same as without the raster.  This
+        requires NumPy.
+        """
+        raster = OccupancyGrid(self.width, self.height, maxspeed)
+        for k in range(self._nborders, len(self.barriers)):
+            raster.add(k, self.barriers[k])
+        self._raster = raster
+
+    def disableRaster(self):
+        self._raster = None
+
+    def getBarrierArray(self):
+        """Return all barriers (including the borders) as SegmentArray.
+        """
+        if self._barrierArray is None:
+            if hasattr(self.barriers, 'segmentArray'):
+                self._barrierArray = self.barriers.segmentArray()
+            else:
+                self._barrierArray = SegmentArray.fromSegments(self.barriers)
+        return self._barrierArray
+
+    def getDistanceField(self):
+        """Return the DistanceField to the finish of the track.
+
+        The field is calculated on first use.
+        """
+        if self._distanceField is None:
+            self._distanceField = DistanceField(self)
+        return self._distanceField
 
     def bbox(self):
         """Return the size of the track.
@@ -62,8 +377,405 @@ class Track(object):
                     ymax = p.y
         return (xmin, ymin, xmax, ymax)
 
+    def isInside(self, p):
+        """True if the Point p lies strictly inside the track borders.
+        """
+        return 0 < p.x < self.width+1 and 0 < p.y < self.height+1
+
+    def findCollision(self, move):
+        """Return the first barrier that the move collides with.
+
+        Return None if there is no collision.
+        """
+        stats = self.stats
+        if stats is not None:
+            stats.collisionChecks += 1
+            if stats.timers:
+                t0 = clock()
+        (p0, p1) = (move.p0, move.p1)
+        collision = None
+        keys = None
+        if not (self.isInside(p0) and self.isInside(p1)):
+            # The track area is convex, so only moves leaving it may
+            # hit a border.
+            for barrier in self.barriers[:self._nborders]:
+                if move.intersects(barrier):
+                    collision = barrier
+                    break
+        elif self._raster is not None:
+            keys = self._raster.candidates(move)
+        if collision is None:
+            if keys is None:
+                keys = self._index.candidates(min(p0.x, p1.x),
+                                              min(p0.y, p1.y),
+                                              max(p0.x, p1.x),
+                                              max(p0.y, p1.y))
+            for k in keys:
+                barrier = self.barriers[k]
+                if move.intersects(barrier):
+                    collision = barrier
+                    break
+        if stats is not None and stats.timers:
+            stats.collisionTime += clock() - t0
+        return collision
+
     def checkCollision(self, move):
-        for barrier in self.barriers:
-            p = move & barrier
-            if p:
-                raise CollisionError(move, barrier, p)
+        barrier = self.findCollision(move)
+        if barrier is not None:
+            # The intersection point is only calculated if the error
+            # really needs to report it.
+            raise CollisionError(move, barrier)
+
+    def checkCollisions(self, moves):
+        """Check many moves for collision at once.
+
+        moves may either be a SegmentArray or a sequence of
+        LineSegments.  Return a boolean NumPy array, that is True for
+        each move that collides with a barrier.  The results are the
+        same as those of findCollision().  This requires NumPy.
+
+        Like findCollision(), the moves are only tested against the
+        barriers in the cells of the spatial index they touch, and, if
+        the raster is enabled, not at all if they are slower than the
+        clearance of their starting point.  The candidate pairs of
+        moves and barriers are gathered and tested in a few vectorized
+        operations, see candidatePairs().
+        """
+        stats = self.stats
+        if stats is not None:
+            stats.collisionChecks += len(moves)
+            if stats.timers:
+                t0 = clock()
+        if not isinstance(moves, SegmentArray):
+            moves = SegmentArray.fromSegments(moves)
+        n = len(moves)
+        collides = numpy.zeros(n, dtype=bool)
+        rows = self.CollisionBlockSize
+        for i in range(0, n, rows):
+            q0 = moves.p0.coords[i:i+rows]
+            q1 = moves.p1.coords[i:i+rows]
+            collides[i:i+rows] = self._checkBlock(q0, q1)
+        if stats is not None and stats.timers:
+            stats.collisionTime += clock() - t0
+        return collides
+
+    def _checkBlock(self, q0, q1):
+        result = numpy.zeros(len(q0), dtype=bool)
+        (w, h) = (self.width + 1, self.height + 1)
+        inside = ((q0 > 0).all(axis=1) & (q1 > 0).all(axis=1) &
+                  (q0[:,0] < w) & (q1[:,0] < w) &
+                  (q0[:,1] < h) & (q1[:,1] < h))
+        # Only moves leaving the track area may hit a border.
+        outside = numpy.flatnonzero(~inside)
+        if len(outside):
+            borders = self.getBarrierArray()
+            borders = SegmentArray(borders.p0.coords[:self._nborders],
+                                   borders.p1.coords[:self._nborders])
+            result[outside] = SegmentArray(q0[outside],
+                                           q1[outside]).intersectsAny(borders)
+        todo = numpy.flatnonzero(~result)
+        raster = self._raster
+        if (raster is not None and len(todo) and
+            q0.dtype.kind == 'i' and q1.dtype.kind == 'i'):
+            # Moves slower than the clearance of their starting point
+            # can not collide.
+            m = todo[inside[todo]]
+            speed = numpy.abs(q1[m] - q0[m]).max(axis=1)
+            clearance = numpy.asarray(raster.clearance())
+            free = speed < clearance[q0[m,0]*raster.ny + q0[m,1]]
+            todo = numpy.setdiff1d(todo, m[free], assume_unique=True)
+        (move, key) = self.candidatePairs(q0[todo], q1[todo])
+        if len(move):
+            a = self.getBarrierArray()
+            hit = SegmentArray(q0[todo][move], q1[todo][move]) \
+                .intersectsPairwise(SegmentArray(a.p0.coords[key],
+                                                 a.p1.coords[key]))
+            result[todo[move[hit]]] = True
+        return result
+
+    def candidatePairs(self, p0, p1):
+        """Return the candidate barriers for the moves from p0 to p1.
+
+        p0 and p1 are NumPy arrays of shape (n, 2).  Return the pair
+        of integer arrays (move, key), such that the barriers
+        self.barriers[key[k]] are those that have to be tested against
+        the moves from p0[move[k]] to p1[move[k]], i.e. the barriers
+        registered in the cells of the spatial index touched by the
+        bounding box of the move whose bounding box overlaps that of
+        the move.  The borders are not included.  This requires NumPy.
+        """
+        (cs, i0, j0, nx, ny, offsets, keys, bmin, bmax) = self._getCells()
+        lo = numpy.minimum(p0, p1)
+        hi = numpy.maximum(p0, p1)
+        clo = numpy.maximum((lo // cs).astype(numpy.int64), (i0, j0))
+        chi = numpy.minimum((hi // cs).astype(numpy.int64),
+                            (i0 + nx - 1, j0 + ny - 1))
+        span = numpy.maximum(chi - clo + 1, 0)
+        # The cells overlapped by the bounding box of each move, ...
+        (move, rank) = _expand(span[:,0] * span[:,1])
+        height = span[move,1]
+        cell = ((clo[move,0] + rank // height - i0) * ny +
+                clo[move,1] + rank % height - j0)
+        # ... the barriers registered in these cells, ...
+        start = offsets[cell]
+        (k, rank) = _expand(offsets[cell + 1] - start)
+        move = move[k]
+        key = keys[start[k] + rank]
+        # ... and those whose bounding boxes overlap.
+        overlap = ((bmin[key] <= hi[move]) &
+                   (lo[move] <= bmax[key])).all(axis=1)
+        return (move[overlap], key[overlap])
+
+    def _getCells(self):
+        # The barriers without the borders in a uniform grid of cells
+        # with the cellsize of the spatial index, in compressed sparse
+        # row form: the keys of the barriers in the cell (i, j) are
+        # keys[offsets[c]:offsets[c+1]] with c = (i-i0)*ny + j-j0.
+        if self._barrierCells is None:
+            cs = self._index.cellsize
+            a = self.getBarrierArray()
+            nb = self._nborders
+            bmin = numpy.minimum(a.p0.coords, a.p1.coords)
+            bmax = numpy.maximum(a.p0.coords, a.p1.coords)
+            clo = (bmin[nb:] // cs).astype(numpy.int64)
+            chi = (bmax[nb:] // cs).astype(numpy.int64)
+            if len(clo):
+                (i0, j0) = clo.min(axis=0).tolist()
+                (nx, ny) = (chi.max(axis=0) - (i0, j0) + 1).tolist()
+            else:
+                (i0, j0, nx, ny) = (0, 0, 0, 0)
+            span = chi - clo + 1
+            (k, rank) = _expand(span[:,0] * span[:,1])
+            height = span[k,1]
+            cell = ((clo[k,0] + rank // height - i0) * ny +
+                    clo[k,1] + rank % height - j0)
+            order = numpy.argsort(cell, kind='mergesort')
+            keys = k[order] + nb
+            offsets = numpy.zeros(nx*ny + 1, dtype=numpy.int64)
+            numpy.cumsum(numpy.bincount(cell, minlength=nx*ny),
+                         out=offsets[1:])
+            self._barrierCells = (cs, i0, j0, nx, ny, offsets, keys,
+                                  bmin, bmax)
+        return self._barrierCells
+
+
+def _expand(counts):
+    # Return the arrays (owner, rank) with counts[i] elements for each
+    # i, owner being i and rank counting from 0 to counts[i]-1.
+    counts = numpy.asarray(counts, dtype=numpy.int64)
+    owner = numpy.repeat(numpy.arange(len(counts)), counts)
+    start = numpy.cumsum(counts) - counts
+    rank = numpy.arange(len(owner)) - start[owner]
+    return (owner, rank)
+
+
+def _latticePoints(p0, p1):
+    # Return the integral points (x, y) on the line segment from p0
+    # to p1.
+    (x0, y0, x1, y1) = (Fraction(p0.x), Fraction(p0.y),
+                        Fraction(p1.x), Fraction(p1.y))
+    if x0 == x1:
+        if x0.denominator != 1:
+            return []
+        (ymin, ymax) = (min(y0, y1), max(y0, y1))
+        return [ (int(x0), y) for y in range(-int(floor(-ymin)),
+                                             int(floor(ymax)) + 1) ]
+    if x0 > x1:
+        (x0, y0, x1, y1) = (x1, y1, x0, y0)
+    points = []
+    for x in range(-int(floor(-x0)), int(floor(x1)) + 1):
+        y = y0 + (x - x0) * (y1 - y0) / (x1 - x0)
+        if y.denominator == 1:
+            points.append((x, int(y)))
+    return points
+
+
+class DistanceField(object):
+    """The distance of each grid point of a track to the finish.
+
+    The distance is a lower bound for the total length of the
+    remaining path of a car from the grid point to the finish,
+    measured in the maximum norm, i.e. the sum of v.norminf() over
+    the remaining moves v.  It is stored in a compact array with one
+    entry per grid point.
+
+    The distance is calculated by a breadth first search over the
+    unit cells of the grid, starting at the cells around the finish.
+    The search may pass from a cell to one of its four side
+    neighbours, unless a barrier covers the whole common edge, and to
+    one of its diagonal neighbours, if the common corner is not on a
+    barrier or if they are connected through one of their common side
+    neighbours.  Any move of the car that does not collide with a
+    barrier can be followed in this way, passing to a cell of the
+    next column (or row) in each step.  Thus, the distance of a grid
+    point, which is one more than the least distance of the cells
+    around it, never overestimates the remaining path, not even if
+    the car slips through a gap between barriers that it could not
+    pass by moving to a neighbouring grid point.
+
+    >>> track = Track(10, 10, Point(2, 5), Point(8, 6),
+    ...               [LineSegment(Point(5, 0), Point(5, 5)),
+    ...                LineSegment(Point(5, 6), Point(5, 11))])
+    >>> distfield = DistanceField(track)
+    >>> distfield.distance(Point(2, 5))
+    6
+    >>> distfield.distance(Point(4, 5)), distfield.distance(Point(6, 6))
+    (4, 2)
+
+    So searches pruned with the distance field still find the way
+    through the gap:
+
+    >>> from racetrack.car import Car
+    >>> from racetrack.backtrack import ConstraintBacktrack
+    >>> backtrack = ConstraintBacktrack(Car(track), maxsteps=12,
+    ...                                 distfield=distfield)
+    >>> backtrack.search()
+    >>> len(backtrack.solution) - 1
+    6
+    """
+
+    Unreachable = -1
+
+    def __init__(self, track):
+        self.track = track
+        self._stride = track.width + 2
+        size = self._stride * (track.height + 2)
+        self._dist = array('i', [self.Unreachable]) * size
+        self._calculate()
+
+    def _blocked(self):
+        # Return three bytearrays indexed by the grid points (x, y):
+        # points marks the points on a barrier, vedges and hedges the
+        # edges from (x, y) to (x, y+1) and to (x+1, y) respectively
+        # that are completely covered by a barrier.  The edges are
+        # only recognized if they are covered by a single barrier,
+        # which errs on the safe side.
+        stride = self._stride
+        (width, height) = (self.track.width, self.track.height)
+        size = stride * (height + 2)
+        points = bytearray(size)
+        vedges = bytearray(size)
+        hedges = bytearray(size)
+        for b in self.track.barriers:
+            for (x, y) in _latticePoints(b.p0, b.p1):
+                if 0 <= x <= width + 1 and 0 <= y <= height + 1:
+                    points[y*stride + x] = 1
+            if b.p0.x == b.p1.x:
+                (edges, along, lo, hi) = (vedges, b.p0.x, b.p0.y, b.p1.y)
+                (nalong, nacross) = (width + 1, height)
+            elif b.p0.y == b.p1.y:
+                (edges, along, lo, hi) = (hedges, b.p0.y, b.p0.x, b.p1.x)
+                (nalong, nacross) = (height + 1, width)
+            else:
+                continue
+            if along != int(along) or not 0 <= along <= nalong:
+                continue
+            (lo, hi) = (min(lo, hi), max(lo, hi))
+            for k in range(max(-int(floor(-lo)), 0),
+                           min(int(floor(hi)) - 1, nacross) + 1):
+                if edges is vedges:
+                    edges[k*stride + int(along)] = 1
+                else:
+                    edges[int(along)*stride + k] = 1
+        return (points, vedges, hedges)
+
+    def _calculate(self):
+        track = self.track
+        (width, height) = (track.width, track.height)
+        dist = self._dist
+        stride = self._stride
+        unreachable = self.Unreachable
+        (points, vedges, hedges) = self._blocked()
+
+        # The distances of the cells.  The cell (i, j) is the unit
+        # square with the lower left corner (i, j), its index is
+        # (j + 1)*cstride + i + 1.  The array has a border of cells
+        # that are never entered.
+        cstride = width + 3
+        cdist = array('i', [unreachable]) * (cstride * (height + 3))
+        for i in range(cstride):
+            cdist[i] = cdist[(height + 2)*cstride + i] = unreachable - 1
+        for j in range(height + 3):
+            cdist[j*cstride] = cdist[j*cstride + width + 2] = unreachable - 1
+
+        finish = track.finish
+        queue = deque()
+        for (i, j) in ((finish.x - 1, finish.y - 1), (finish.x, finish.y - 1),
+                       (finish.x - 1, finish.y), (finish.x, finish.y)):
+            c = (j + 1)*cstride + i + 1
+            cdist[c] = 0
+            queue.append(c)
+        while queue:
+            c = queue.popleft()
+            d = cdist[c] + 1
+            (j, i) = divmod(c, cstride)
+            # The index of the lower left corner of the cell.
+            p = (j - 1)*stride + i - 1
+            right = not vedges[p + 1]
+            left = not vedges[p]
+            up = not hedges[p + stride]
+            down = not hedges[p]
+            for (n, passable) in ((c + 1, right), (c - 1, left),
+                                  (c + cstride, up), (c - cstride, down)):
+                if passable and cdist[n] == unreachable:
+                    cdist[n] = d
+                    queue.append(n)
+            # A diagonal neighbour is reached through the common corner
+            # or through one of the two common side neighbours, going
+            # first either sideways (side1 and the edge h) or up or
+            # down (side2 and the edge v).
+            for (n, corner, side1, h, side2, v) in (
+                    (c + cstride + 1, p + stride + 1,
+                     right, p + stride + 1, up, p + stride + 1),
+                    (c + cstride - 1, p + stride,
+                     left, p + stride - 1, up, p + stride),
+                    (c - cstride + 1, p + 1,
+                     right, p + 1, down, p - stride + 1),
+                    (c - cstride - 1, p,
+                     left, p - 1, down, p - stride)):
+                if cdist[n] != unreachable:
+                    continue
+                if (not points[corner] or side1 and not hedges[h] or
+                    side2 and not vedges[v]):
+                    cdist[n] = d
+                    queue.append(n)
+
+        # The distance of a grid point is one more than the least
+        # distance of the cells around it.  The points on a barrier
+        # can not be reached at all.
+        for y in range(1, height + 1):
+            for x in range(1, width + 1):
+                if points[y*stride + x]:
+                    continue
+                c = y*cstride + x
+                d = None
+                for n in (c, c + 1, c + cstride, c + cstride + 1):
+                    if cdist[n] >= 0 and (d is None or cdist[n] < d):
+                        d = cdist[n]
+                if d is not None:
+                    dist[y*stride + x] = d + 1
+        dist[finish.y*stride + finish.x] = 0
+
+    def distance(self, p):
+        """Return the distance of the grid point p to the finish.
+
+        Return None if p is outside of the track or if the finish
+        can not be reached from p.
+        """
+        if not self.track.isInside(p):
+            return None
+        d = self._dist[p.y*self._stride + p.x]
+        if d == self.Unreachable:
+            return None
+        return d
+
+    def asArray(self):
+        """Return the distances as NumPy integer array.
+
+        The element [x, y] is the distance of the grid point (x, y),
+        or Unreachable.  The array has the shape (width + 2, height +
+        2) and covers the whole track including its borders.  This
+        requires NumPy.
+        """
+        dist = numpy.array(self._dist, dtype=numpy.int64)
+        return dist.reshape(self.track.height + 2, self._stride).T
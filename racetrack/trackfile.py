@@ -0,0 +1,278 @@
+"""Store tracks in files.
+
+A track file holds the bounds, start and finish of a track and the
+coordinates of all its barriers (not including the borders) as packed
+arrays of 32 bit integers in little endian byte order.  Optionally,
+the spatial index of the barriers is stored as well.  A track file
+is loaded by memory mapping it, the LineSegment objects of the
+barriers are only created when they are accessed.  This allows to
+load large tracks in a very short time.
+
+The file starts with a header of fixed size:
+
+    magic (4 bytes), version, width, height, start.x, start.y,
+    finish.x, finish.y, number of barriers, cellsize, i0, j0, nx, ny,
+    number of index entries
+
+where all fields after the magic are 32 bit integers.  It is followed
+by the barriers as quadruples (x0, y0, x1, y1).  If cellsize is not
+zero, the spatial index follows in compressed sparse row form: the
+nx*ny grid cells starting at (i0, j0) in row major order (e.g. cell
+(i, j) has the number (j - j0)*nx + i - i0), an array of nx*ny+1
+offsets into the array of index entries, and the index entries, e.g.
+the numbers of the barriers registered in each cell.
+
+>>> import os, tempfile
+>>> barriers = [ LineSegment(Point(5, 0), Point(5, 3)),
+...              LineSegment(Point(2, 4), Point(8, 4)) ]
+>>> track = Track(10, 5, Point(1, 1), Point(9, 1), barriers)
+>>> fname = os.path.join(tempfile.mkdtemp(), 'track.rt')
+>>> save(track, fname)
+>>> t = Track.load(fname)
+>>> (t.width, t.height, t.start, t.finish)
+(10, 5, Point(x=1, y=1), Point(x=9, y=1))
+>>> list(t.barriers) == list(track.barriers)
+True
+>>> t.findCollision(LineSegment(Point(4, 1), Point(6, 2)))
+LineSegment(Point(x=5, y=0), Point(x=5, y=3))
+>>> t.findCollision(LineSegment(Point(4, 3), Point(4, 2))) is None
+True
+
+A loaded track can be pickled, e.g. to pass it to worker processes.
+The packed arrays are pickled as bytes:
+
+>>> import pickle
+>>> t2 = pickle.loads(pickle.dumps(t))
+>>> list(t2.barriers) == list(track.barriers)
+True
+>>> t2.findCollision(LineSegment(Point(4, 1), Point(6, 2)))
+LineSegment(Point(x=5, y=0), Point(x=5, y=3))
+"""
+
+
+import struct
+import mmap
+from racetrack.linalg import *
+from racetrack.linalg import numpy
+from racetrack.track import Track, BarrierGrid
+from racetrack.binfile import packInts, intArray, packedBytes
+
+
+Magic = b'RTRK'
+Version = 1
+_header = struct.Struct('<4s14i')
+
+
+class PackedBarrierList(object):
+    """The barriers of a track loaded from a file.
+
+    This is a sequence of LineSegments.  It starts with the borders
+    of the track, followed by the barriers from the file, which are
+    created from the packed coordinates on first access, followed by
+    any barriers appended later on.
+    """
+
+    def __init__(self, borders, coords):
+        self._borders = list(borders)
+        self.coords = coords
+        self._npacked = len(coords) // 4
+        self._segments = [None] * self._npacked
+        self._extra = []
+
+    def __len__(self):
+        return len(self._borders) + self._npacked + len(self._extra)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [ self[k] for k in range(*i.indices(len(self))) ]
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("barrier index out of range")
+        nb = len(self._borders)
+        if i < nb:
+            return self._borders[i]
+        i -= nb
+        if i < self._npacked:
+            s = self._segments[i]
+            if s is None:
+                c = self.coords
+                s = LineSegment(Point(c[4*i], c[4*i+1]),
+                                Point(c[4*i+2], c[4*i+3]))
+                self._segments[i] = s
+            return s
+        return self._extra[i - self._npacked]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['coords'] = packedBytes(self.coords)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        coords = state['coords']
+        self.coords = intArray(coords, 0, len(coords) // 4)
+
+    def append(self, barrier):
+        self._extra.append(barrier)
+
+    def extend(self, barriers):
+        self._extra.extend(barriers)
+
+    def segmentArray(self):
+        """Return all barriers as SegmentArray.
+
+        The packed coordinates are used directly, without creating
+        LineSegment objects for them.
+        """
+        borders = SegmentArray.fromSegments(self._borders)
+        packed = numpy.frombuffer(self.coords, dtype=numpy.int32)
+        packed = packed.reshape(-1, 4).astype(numpy.int64)
+        extra = SegmentArray.fromSegments(self._extra)
+        p0 = numpy.concatenate((borders.p0.coords, packed[:,0:2],
+                                extra.p0.coords))
+        p1 = numpy.concatenate((borders.p1.coords, packed[:,2:4],
+                                extra.p1.coords))
+        return SegmentArray(p0, p1)
+
+
+class PackedBarrierGrid(BarrierGrid):
+    """A BarrierGrid loaded from a file.
+
+    The cells are held in compressed sparse row form.  Barriers added
+    later on are registered in the dictionary of the base class.
+    keyoffset is added to the barrier numbers from the file to get the
+    keys, coords are the packed coordinates of the barriers.
+    """
+
+    def __init__(self, cellsize, i0, j0, nx, ny, offsets, entries,
+                 coords, keyoffset):
+        super(PackedBarrierGrid, self).__init__(cellsize)
+        self.i0 = i0
+        self.j0 = j0
+        self.nx = nx
+        self.ny = ny
+        self.offsets = offsets
+        self.entries = entries
+        self.coords = coords
+        self.keyoffset = keyoffset
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ('offsets', 'entries', 'coords'):
+            state[name] = packedBytes(state[name])
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for name in ('offsets', 'entries', 'coords'):
+            data = state[name]
+            setattr(self, name, intArray(data, 0, len(data) // 4))
+
+    def candidates(self, x0, y0, x1, y1):
+        result = super(PackedBarrierGrid, self).candidates(x0, y0, x1, y1)
+        (i0, j0, i1, j1) = self._cellrange(x0, y0, x1, y1)
+        i0 = max(i0, self.i0)
+        j0 = max(j0, self.j0)
+        i1 = min(i1, self.i0 + self.nx - 1)
+        j1 = min(j1, self.j0 + self.ny - 1)
+        if i0 > i1 or j0 > j1:
+            return result
+        offsets = self.offsets
+        entries = self.entries
+        keys = set()
+        for j in range(j0, j1+1):
+            row = (j - self.j0)*self.nx - self.i0
+            for i in range(i0, i1+1):
+                c = row + i
+                keys.update(entries[offsets[c]:offsets[c+1]])
+        coords = self.coords
+        for m in keys:
+            (ax, ay, bx, by) = coords[4*m:4*m+4]
+            if (min(ax, bx) <= x1 and x0 <= max(ax, bx) and
+                min(ay, by) <= y1 and y0 <= max(ay, by)):
+                result.append(m + self.keyoffset)
+        result.sort()
+        return result
+
+
+def save(track, fname, index=True):
+    """Write the track to the file fname.
+
+    The coordinates of all barriers must be integral.  If index is
+    True, the spatial index of the barriers is saved as well.
+    """
+    nb = track._nborders
+    barriers = track.barriers[nb:]
+    coords = []
+    for b in barriers:
+        if not b.isIntegral():
+            raise ValueError("Barrier %s is not integral." % b)
+        coords.extend((int(b.p0.x), int(b.p0.y),
+                       int(b.p1.x), int(b.p1.y)))
+    cellsize = 0
+    (i0, j0, nx, ny) = (0, 0, 0, 0)
+    offsets = []
+    entries = []
+    if index and barriers:
+        grid = BarrierGrid(track._index.cellsize)
+        for (k, b) in enumerate(barriers):
+            grid.add(k, b)
+        cellsize = grid.cellsize
+        i0 = min(i for (i, j) in grid.cells)
+        j0 = min(j for (i, j) in grid.cells)
+        nx = max(i for (i, j) in grid.cells) - i0 + 1
+        ny = max(j for (i, j) in grid.cells) - j0 + 1
+        for j in range(j0, j0+ny):
+            for i in range(i0, i0+nx):
+                offsets.append(len(entries))
+                entries.extend(grid.cells.get((i, j), ()))
+        offsets.append(len(entries))
+    header = _header.pack(Magic, Version, track.width, track.height,
+                          track.start.x, track.start.y,
+                          track.finish.x, track.finish.y,
+                          len(barriers), cellsize, i0, j0, nx, ny,
+                          len(entries))
+    with open(fname, 'wb') as f:
+        f.write(header)
+        f.write(packInts(coords))
+        if cellsize:
+            f.write(packInts(offsets))
+            f.write(packInts(entries))
+
+
+def load(fname):
+    """Load a track from the file fname.
+    """
+    with open(fname, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(buf) < _header.size:
+        raise ValueError("Track file is truncated.")
+    (magic, version, width, height, sx, sy, fx, fy,
+     nbarriers, cellsize, i0, j0, nx, ny,
+     nentries) = _header.unpack(buf[:_header.size])
+    if magic != Magic:
+        raise ValueError("%s is not a track file." % fname)
+    if version != Version:
+        raise ValueError("Unsupported track file version %d." % version)
+    track = Track(width, height, Point(sx, sy), Point(fx, fy))
+    offset = _header.size
+    coords = intArray(buf, offset, 4*nbarriers, 'Track file')
+    offset += 4 * len(coords)
+    nb = len(track.barriers)
+    track.barriers = PackedBarrierList(track.barriers, coords)
+    if cellsize:
+        offsets = intArray(buf, offset, nx*ny+1, 'Track file')
+        offset += 4 * len(offsets)
+        entries = intArray(buf, offset, nentries, 'Track file')
+        track._index = PackedBarrierGrid(cellsize, i0, j0, nx, ny,
+                                         offsets, entries, coords, nb)
+    else:
+        for k in range(nb, len(track.barriers)):
+            track._index.add(k, track.barriers[k])
+    return track
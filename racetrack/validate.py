@@ -0,0 +1,178 @@
+"""Check many paths for legality at once.
+
+The paths are passed packed into two integer arrays, as returned by
+packPaths(): points of shape (m, 2) with the points of all paths one
+after the other and offsets of length n+1, such that path i consists
+of points[offsets[i]:offsets[i+1]].  As with Car.path, a path starts
+at the start of the track and ends at rest in the finish, that is,
+with the finish point repeated.
+
+>>> from racetrack.track import Track
+>>> track = Track(10, 5, Point(1, 1), Point(9, 1),
+...               [LineSegment(Point(5, 0), Point(5, 3))])
+>>> paths = [
+...     [(1, 1), (2, 2), (4, 3), (5, 4), (5, 4), (6, 3), (8, 2), (9, 1), (9, 1)],
+...     [(1, 1), (2, 2), (4, 4), (7, 4)],
+...     [(1, 1), (2, 1), (4, 1), (6, 1)],
+...     [(2, 1), (3, 1)],
+...     [(1, 1), (2, 2), (3, 3)],
+... ]
+>>> (points, offsets) = packPaths(paths)
+>>> result = validatePaths(track, points, offsets)
+>>> result.valid.tolist()
+[True, False, False, False, False]
+>>> [ result.reasonName(i) for i in range(len(paths)) ]
+['valid', 'acceleration', 'collision', 'start', 'finish']
+>>> result.index.tolist()
+[-1, 3, 3, 0, 2]
+"""
+
+
+from racetrack.linalg import *
+from racetrack.linalg import numpy
+from racetrack.rules import EightNeighboursRule
+
+
+class ValidationResult(object):
+    """The result of validatePaths().
+
+    valid is a boolean NumPy array that is True for each legal path.
+    For each illegal path, reason holds the reason of its first
+    violation and index the index of the first point of the path that
+    is not legal, i.e. the point that is not the start, the point that
+    can not be reached from the previous one, or the last point if
+    the path does not end in the finish.  For legal paths, reason is
+    Valid and index is -1.
+    """
+
+    Valid = 0
+    BadStart = 1
+    BadAcceleration = 2
+    Collision = 3
+    NotFinished = 4
+
+    ReasonNames = ('valid', 'start', 'acceleration', 'collision', 'finish')
+
+    def __init__(self, reason, index):
+        self.reason = reason
+        self.index = index
+        self.valid = reason == self.Valid
+
+    def __len__(self):
+        return len(self.reason)
+
+    def reasonName(self, i):
+        """Return the name of the reason for path i.
+        """
+        return self.ReasonNames[self.reason[i]]
+
+
+def packPaths(paths):
+    """Pack a sequence of paths into the arrays (points, offsets).
+
+    Each path is a sequence of Points or of (x, y) tuples.
+    """
+    lengths = [ len(p) for p in paths ]
+    offsets = numpy.zeros(len(paths) + 1, dtype=numpy.int64)
+    numpy.cumsum(lengths, out=offsets[1:])
+    points = numpy.empty((offsets[-1], 2), dtype=numpy.int64)
+    for (i, p) in enumerate(paths):
+        if len(p):
+            points[offsets[i]:offsets[i+1]] = p
+    return (points, offsets)
+
+
+def _uniqueRows(a):
+    # Return the unique rows of the integer array a and the indices
+    # that reconstruct a from them.  Sorting one integer key per row
+    # is much faster than numpy.unique(axis=0), so the rows are packed
+    # into one if the range of the values allows to.
+    lo = a.min(axis=0)
+    span = a.max(axis=0) - lo + 1
+    if numpy.prod(span.astype(float)) < 2.0**62:
+        key = numpy.zeros(len(a), dtype=numpy.int64)
+        for k in range(a.shape[1]):
+            key = key * span[k] + (a[:, k] - lo[k])
+        (key, first, inverse) = numpy.unique(key, return_index=True,
+                                             return_inverse=True)
+        return (a[first], inverse.ravel())
+    (unique, inverse) = numpy.unique(a, axis=0, return_inverse=True)
+    return (unique, inverse.ravel())
+
+
+def validatePaths(track, points, offsets, rule=EightNeighboursRule):
+    """Check the paths packed in points and offsets on track.
+
+    Check that each path starts at the start of track, that each
+    acceleration is allowed by rule, that no move collides with a
+    barrier and that the path ends at rest in the finish.  All moves
+    of all paths are checked in a few vectorized operations, moves
+    occurring in several paths are checked for collision only once.
+    Return a ValidationResult.  This requires NumPy.
+    """
+    points = numpy.asarray(points, dtype=numpy.int64).reshape(-1, 2)
+    offsets = numpy.asarray(offsets, dtype=numpy.int64)
+    n = len(offsets) - 1
+    lengths = offsets[1:] - offsets[:-1]
+    reason = numpy.zeros(n, dtype=numpy.int8)
+    index = numpy.full(n, -1, dtype=numpy.int64)
+
+    # The moves of all paths, move j going from points[j] to
+    # points[j+1].  The last point of each path starts no move.
+    nonempty = lengths > 0
+    isLast = numpy.zeros(len(points), dtype=bool)
+    isLast[offsets[1:][nonempty] - 1] = True
+    isFirst = numpy.zeros(len(points), dtype=bool)
+    isFirst[offsets[:-1][nonempty]] = True
+    moves = numpy.flatnonzero(~isLast)
+    path = numpy.repeat(numpy.arange(n), numpy.maximum(lengths - 1, 0))
+    vel = points[moves + 1] - points[moves]
+    prev = numpy.zeros_like(vel)
+    notFirst = ~isFirst[moves]
+    prev[notFirst] = vel[numpy.flatnonzero(notFirst) - 1]
+
+    allowed = rule.areAllowed(vel - prev, prev)
+    bad = numpy.where(allowed, ValidationResult.Valid,
+                      ValidationResult.BadAcceleration).astype(numpy.int8)
+    if allowed.any():
+        segments = numpy.column_stack((points[moves[allowed]],
+                                       vel[allowed]))
+        (unique, inverse) = _uniqueRows(segments)
+        collides = track.checkCollisions(
+            SegmentArray(unique[:, :2], unique[:, :2] + unique[:, 2:]))
+        bad[numpy.flatnonzero(allowed)[collides[inverse]]] = \
+            ValidationResult.Collision
+
+    # The first bad move of each path.  The moves are ordered by path,
+    # so this is the first occurrence of the path among the bad moves.
+    badMoves = numpy.flatnonzero(bad)
+    badPaths = path[badMoves]
+    first = numpy.ones(len(badMoves), dtype=bool)
+    first[1:] = badPaths[1:] != badPaths[:-1]
+    badPaths = badPaths[first]
+    j = badMoves[first]
+    reason[badPaths] = bad[j]
+    index[badPaths] = moves[j] + 1 - offsets[badPaths]
+
+    # Paths with legal moves must end at rest in the finish.
+    finish = numpy.array(track.finish, dtype=numpy.int64)
+    last = offsets[1:] - 1
+    ok = nonempty & (reason == ValidationResult.Valid)
+    atFinish = numpy.zeros(n, dtype=bool)
+    atFinish[ok] = (points[last[ok]] == finish).all(axis=1)
+    atRest = lengths < 2
+    moving = ok & ~atRest
+    atRest[moving] = (points[last[moving]] ==
+                      points[last[moving] - 1]).all(axis=1)
+    notFinished = ok & ~(atFinish & atRest)
+    reason[notFinished] = ValidationResult.NotFinished
+    index[notFinished] = lengths[notFinished] - 1
+
+    # A wrong start precedes any other violation.
+    start = numpy.array(track.start, dtype=numpy.int64)
+    badStart = ~nonempty
+    badStart[nonempty] = (points[offsets[:-1][nonempty]] != start).any(axis=1)
+    reason[badStart] = ValidationResult.BadStart
+    index[badStart] = 0
+
+    return ValidationResult(reason, index)
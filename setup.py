@@ -1,6 +1,19 @@
 #! /usr/bin/python
 
-from distutils.core import setup
+try:
+    from setuptools import setup
+    setuptools_kwargs = {
+        'entry_points': {
+            'console_scripts': [
+                'racetrack-solve = racetrack.batch:main',
+            ],
+        },
+    }
+except ImportError:
+    # Without setuptools, there are no console entry points.  The
+    # batch solver may still be run as python -m racetrack.batch.
+    from distutils.core import setup
+    setuptools_kwargs = {}
 try:
     from distutils.command.build_py import build_py_2to3 as build_py
 except ImportError:
@@ -45,4 +58,5 @@ setup(
         "Topic :: Games/Entertainment :: Board Games",
     ],
     cmdclass = {'build_py': build_py},
+    **setuptools_kwargs
 )